@@ -0,0 +1,149 @@
+import os
+import hashlib
+import numpy as np
+import pandas as pd
+
+
+# Columns needed to build a scorerank graph
+MATCH_COLUMNS = ['Div', 'Date', 'HomeTeam', 'AwayTeam', 'FTHG', 'FTAG', 'FTR']
+
+# Compact dtypes: team names etc. as categoricals, goals as int8, other numbers as float32 and other text as categoricals
+CATEGORY_COLUMNS = ['Div', 'HomeTeam', 'AwayTeam', 'FTR', 'HTR', 'Referee']
+TEAM_COLUMNS = ['HomeTeam', 'AwayTeam']
+GOAL_COLUMNS = ['FTHG', 'FTAG', 'HTHG', 'HTAG']
+
+CACHE_DIR = '.match_cache'
+
+
+def load_matches(csv_list, columns=MATCH_COLUMNS, cache_dir=CACHE_DIR):
+	"""
+	Load only the given columns of a list of season CSVs into one dataframe
+
+	Files may be seasons of one league or several leagues/divisions (the Div
+	column, or the file name as football-data names them, e.g. E0.csv, tells
+	them apart). Dates are parsed to datetimes and compact dtypes used. The result is cached
+	(as .npz in cache_dir) keyed on the files' modification times, so later runs
+	skip CSV parsing. Pass cache_dir=None to always read the CSVs
+	"""
+	columns = list(columns)
+	cache_file = None
+	if cache_dir is not None:
+		cache_file = os.path.join(cache_dir, cache_key(csv_list, columns) + '.npz')
+		if os.path.exists(cache_file):
+			return read_cache(cache_file)
+
+	# Read each file (requested columns only) and concatenate once
+	wanted = set(columns)
+	frames = [pd.read_csv(filename, usecols=lambda column: column in wanted) for filename in csv_list]
+	for filename, frame in zip(csv_list, frames):
+		if 'Div' in wanted and 'Div' not in frame:
+			frame['Div'] = division_name(filename)
+	df = pd.concat(frames, ignore_index=True, sort=False).reindex(columns=columns)
+	df = compact_dtypes(df)
+
+	if cache_file is not None:
+		if not os.path.exists(cache_dir):
+			os.makedirs(cache_dir)
+		write_cache(cache_file, df)
+	return df
+
+
+def compact_dtypes(df):
+	"""
+	Parse dates and convert columns to compact dtypes (home/away teams share categories)
+	"""
+	teams = set()
+	for column in TEAM_COLUMNS:
+		if column in df:
+			teams.update(df[column].dropna())
+	teams = sorted(teams)
+	for column in df.columns:
+		if column == 'Date':
+			df[column] = parse_dates(df[column])
+		elif column in TEAM_COLUMNS:
+			df[column] = pd.Categorical(df[column], categories=teams)
+		elif column in CATEGORY_COLUMNS:
+			df[column] = df[column].astype('category')
+		elif column in GOAL_COLUMNS and df[column].notnull().all():
+			df[column] = df[column].astype(np.int8)
+		elif is_numeric(df[column]):
+			df[column] = pd.to_numeric(df[column]).astype(np.float32)
+		else:
+			df[column] = df[column].astype('category')  # other text, e.g. Time or Country
+	return df
+
+
+def is_numeric(series):
+	"""
+	Returns True if every value of the series (ignoring missing ones) is a number
+	"""
+	if series.dtype != object:
+		return series.dtype.kind in 'biuf'
+	return pd.to_numeric(series, errors='coerce').notnull().sum() == series.notnull().sum()
+
+
+def sort_by_date(df):
+	"""
+	Returns matches in date order, keeping file order within a date (stable sort) and a fresh index
+	"""
+	return df.sort_values('Date', kind='mergesort').reset_index(drop=True)
+
+
+def parse_dates(dates):
+	"""
+	Parse dd/mm/yy dates, or dd/mm/yyyy as some leagues' files use
+	"""
+	parsed = pd.to_datetime(dates, format='%d/%m/%y', errors='coerce')
+	long_years = parsed.isnull() & dates.notnull()
+	if long_years.any():
+		parsed[long_years] = pd.to_datetime(dates[long_years], format='%d/%m/%Y')
+	return parsed
+
+
+def division_name(filename):
+	"""
+	Returns division for a CSV without a Div column, from its file name (e.g. 'data/E0.csv' -> 'E0')
+	"""
+	return os.path.splitext(os.path.basename(filename))[0]
+
+
+def cache_key(csv_list, columns):
+	"""
+	Returns hash of the file names, their modification times and the columns requested
+	"""
+	key = [(os.path.abspath(filename), os.path.getmtime(filename)) for filename in csv_list]
+	return hashlib.md5(repr((key, columns)).encode('utf-8')).hexdigest()
+
+
+def write_cache(cache_file, df):
+	"""
+	Save dataframe as .npz (categoricals stored as codes plus categories)
+	"""
+	arrays = {'columns': np.array(df.columns.tolist())}
+	for column in df.columns:
+		series = df[column]
+		if hasattr(series, 'cat'):
+			arrays[column + '.codes'] = series.cat.codes.values
+			arrays[column + '.categories'] = np.array(series.cat.categories.tolist())
+		elif column == 'Date':
+			arrays[column] = series.values.astype('datetime64[ns]')
+		else:
+			arrays[column] = series.values
+	# Write to a temporary file first so an interrupted run never leaves a partial cache
+	temp_file = cache_file + '.tmp.npz'
+	np.savez(temp_file, **arrays)
+	os.rename(temp_file, cache_file)
+
+
+def read_cache(cache_file):
+	"""
+	Load dataframe saved by write_cache
+	"""
+	df = pd.DataFrame()
+	with np.load(cache_file) as arrays:
+		for column in arrays['columns'].tolist():
+			if column + '.codes' in arrays.files:
+				df[column] = pd.Categorical.from_codes(arrays[column + '.codes'], arrays[column + '.categories'].tolist())
+			else:
+				df[column] = arrays[column]
+	return df
@@ -1,3 +1,14 @@
+import array
+import logging
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+
+# Tracing goes to this logger (e.g. logging.basicConfig(level=logging.DEBUG) to see it)
+logger = logging.getLogger('SR_Graph')
+
+
 class Graph:
 	"""
 	Class with teams as nodes, scores as edges
@@ -5,11 +16,20 @@ class Graph:
 	Team strength distributed around the graph via scores
 	"""
 
-	def __init__(self, leak=0.2):
+	def __init__(self, leak=0.2, debug=False):
 		self.nodes = {}
 		self.size = 0
 		self.leak = leak
-		self.debug = False
+		self.debug = debug
+		self.iterations = 0
+		self.residual = None
+		self.history = None
+		self.positions = None  # {team: position} for the current scoreranks, built when first asked for
+		self.personalization = None  # {team: random hop weight}, None for 1.0 for every team
+		self.hops = None  # random hop weight of every node, built when first iterated
+		if debug:
+			# Chosen once here so the normal iteration has no per-edge debug checks
+			self.iterate_scoreranks = self.iterate_scoreranks_traced
 
 	def add_node(self, team, redistribute = False):
 		"""
@@ -19,9 +39,18 @@ class Graph:
 		if team not in self.nodes:
 			self.size+=1
 			self.nodes[team] = new_node
+			self.positions = None
+			self.hops = None
 		if redistribute:
 			self.redistribute_scoreranks()
 
+	def add_nodes(self, teams):
+		"""
+		Add several nodes to the graph
+		"""
+		for team in teams:
+			self.add_node(team)
+
 	def add_edge(self, team_from, team_to, weight):
 		"""
 		Add an edge between two teams, with an associated weight (adds teams if not already present)
@@ -29,20 +58,95 @@ class Graph:
 		if team_from not in self.nodes:
 			self.add_node(team_from)
 			if self.debug:
-				print "Added node {}".format(team_from)
+				logger.debug("Added node %s", team_from)
 		v_from = self.nodes[team_from]
 
 		if team_to not in self.nodes:
 			self.add_node(team_to)
 			if self.debug:
-				print "Added node {}".format(team_to)
+				logger.debug("Added node %s", team_to)
 		v_to = self.nodes[team_to]			
 
 		v_from.add_outgoing(v_to, weight)
 		v_to.add_incoming(v_from, weight)
 
 		if self.debug:
-			print "Added edge from {} to {} with weight {}".format(team_from, team_to, weight)
+			logger.debug("Added edge from %s to %s with weight %s", team_from, team_to, weight)
+
+	@classmethod
+	def from_matches(cls, home, away, home_goals, away_goals, leak=0.2, debug=False, teams=None):
+		"""
+		Create graph from whole columns/arrays of matches rather than edge by edge
+
+		Same graph as calling add_edge for each team's goals in each match: teams
+		are numbered in the order they first appear (or the order of teams, if
+		given), and repeat pairings summed
+		"""
+		teams, team_from, team_to, weights = match_edges(home, away, home_goals, away_goals, teams)
+		G = cls(leak=leak, debug=debug)
+		G.add_nodes(teams)
+		vertices = [G.nodes[team] for team in teams]
+		for i, j, weight in zip(team_from.tolist(), team_to.tolist(), weights.tolist()):
+			v_from = vertices[i]
+			v_to = vertices[j]
+			v_from.add_outgoing(v_to, weight)
+			v_to.add_incoming(v_from, weight)
+		return G
+
+	def remove_edge(self, team_from, team_to, weight):
+		"""
+		Remove weight from an edge between two teams (edge dropped once its weight reaches 0)
+		"""
+		v_from = self.nodes[team_from]
+		v_to = self.nodes[team_to]
+		v_from.remove_outgoing(v_to, weight)
+		v_to.remove_incoming(v_from, weight)
+
+		if self.debug:
+			logger.debug("Removed weight %s from edge %s to %s", weight, team_from, team_to)
+
+	def add_match(self, home_team, away_team, home_goals, away_goals):
+		"""
+		Add a match: an edge from each team to the other weighted by the goals the other scored
+		"""
+		self.add_edge(team_from = home_team, team_to = away_team, weight = away_goals)
+		self.add_edge(team_from = away_team, team_to = home_team, weight = home_goals)
+
+	def remove_match(self, home_team, away_team, home_goals, away_goals):
+		"""
+		Remove a match added with add_match
+		"""
+		self.remove_edge(team_from = home_team, team_to = away_team, weight = away_goals)
+		self.remove_edge(team_from = away_team, team_to = home_team, weight = home_goals)
+
+	def remove_node(self, team):
+		"""
+		Remove a node from the graph, along with any edges still attached to it
+		"""
+		node = self.nodes[team]
+		for nbr in node.outgoing.keys():
+			nbr.remove_incoming(node, node.outgoing[nbr])
+		for nbr in node.incoming.keys():
+			nbr.remove_outgoing(node, node.incoming[nbr])
+		del self.nodes[team]
+		self.size -= 1
+		self.positions = None
+		self.hops = None
+
+		if self.debug:
+			logger.debug("Removed node %s", team)
+
+	def scale_edges(self, factor):
+		"""
+		Multiply every edge weight by factor (scoreranks unchanged: each team's shares stay the same)
+		"""
+		for node in self.nodes.values():
+			for nbr in node.outgoing:
+				node.outgoing[nbr] *= factor
+			for nbr in node.incoming:
+				node.incoming[nbr] *= factor
+			node.outgoing_number *= factor
+			node.incoming_number *= factor
 
 	def get_node(self, team_name):
 		"""
@@ -64,36 +168,97 @@ class Graph:
 		scoreranks.sort(key=lambda x: x[1], reverse=True)
 		return scoreranks
 
+	def top_scoreranks(self, k):
+		"""
+		Return [(team, scorerank)] for the k highest scoreranks, highest first (without sorting every team)
+		"""
+		teams, scoreranks = self.ranked_teams()
+		return [(teams[i], scoreranks[i]) for i in top_indices(scoreranks, k)]
+
+	def bottom_scoreranks(self, k):
+		"""
+		Return [(team, scorerank)] for the k lowest scoreranks, lowest first
+		"""
+		teams, scoreranks = self.ranked_teams()
+		return [(teams[i], scoreranks[i]) for i in top_indices(scoreranks, k, lowest=True)]
+
+	def get_position(self, team_name):
+		"""
+		Return position of team when ranked by scorerank (1 = highest)
+
+		Positions of all teams are worked out once and kept until the scoreranks
+		change, so each lookup after the first is a dict lookup
+		"""
+		if self.positions is None:
+			teams, scoreranks = self.ranked_teams()
+			self.positions = dict((teams[i], position) for position, i in enumerate(top_indices(scoreranks, len(teams)), 1))
+		return self.positions[team_name]
+
+	def ranked_teams(self):
+		"""
+		Returns (teams, array of their scoreranks) in node order
+		"""
+		return list(self.nodes), self.scorerank_vector()
+
+	def scorerank_differences(self, home_teams, away_teams):
+		"""
+		Return (home minus away scorerank array, mask of fixtures with both teams ranked) for lists of fixtures
+		"""
+		teams, scoreranks = self.ranked_teams()
+		return fixture_differences(dict((team, i) for i, team in enumerate(teams)), scoreranks, home_teams, away_teams)
+
 	def iterate_scoreranks(self):
 		"""
 		Update all scoreranks by 1 iteration
 		"""
+		hops = self.hop_weights()
 		for team in self.nodes:
 			# Calculate 'out' scorerank
 			node = self.nodes[team]
 			if node.outgoing_number == 0:
 				continue
 			out_scorerank = (node.scorerank * 1.0 / node.outgoing_number)
-			if self.debug:
-				print "We have a node --> {}".format(node); print "Its scorerank outgoing is {}".format(out_scorerank)
-				pass
+			# Send it to its 'out' nodes (to temp slot)
+			for nbr in node.outgoing:
+				nbr.scorerank_updating += out_scorerank * node.outgoing[nbr]
+
+		leak = self.leak
+		for team, node in self.nodes.iteritems():
+			# Add all incoming with random hop value and redistribution factor
+			node.scorerank = (1-leak) * node.scorerank_updating   # i.e. actual scorerank assigned
+			node.scorerank += leak * hops[team]    # i.e. random hop
+			node.scorerank_updating = 0
+		self.positions = None
+
+	def iterate_scoreranks_traced(self):
+		"""
+		Update all scoreranks by 1 iteration, logging every score sent (used when debug=True)
+		"""
+		hops = self.hop_weights()
+		for team in self.nodes:
+			# Calculate 'out' scorerank
+			node = self.nodes[team]
+			if node.outgoing_number == 0:
+				continue
+			out_scorerank = (node.scorerank * 1.0 / node.outgoing_number)
+			logger.debug("We have a node --> %s", node)
+			logger.debug("Its scorerank outgoing is %s", out_scorerank)
 			# Send it to its 'out' nodes (to temp slot)
 			for nbr in node.outgoing:
 				send_score = out_scorerank * node.outgoing[nbr]
 				nbr.scorerank_updating += send_score
-				if self.debug:
-					print "   Sending to node --> {}".format(nbr); print "   Score sent is {}".format(send_score)
-					pass		
+				logger.debug("   Sending to node --> %s", nbr)
+				logger.debug("   Score sent is %s", send_score)
 
-		for team in self.nodes:
+		leak = self.leak
+		for team, node in self.nodes.iteritems():
 			# Add all incoming with random hop value and redistribution factor
-			node = self.nodes[team]
-			node.scorerank = (1-self.leak) * node.scorerank_updating   # i.e. actual scorerank assigned
-			node.scorerank += (self.leak) * 1.0    # i.e. random hop
+			node.scorerank = (1-leak) * node.scorerank_updating   # i.e. actual scorerank assigned
+			node.scorerank += leak * hops[team]    # i.e. random hop
 			node.scorerank_updating = 0
+		self.positions = None
 
-		if self.debug:
-			print "Total scorerank after iterations: {}".format(self.total_scorerank())		
+		logger.debug("Total scorerank after iterations: %s", self.total_scorerank())
 
 	def redistribute_scoreranks(self):
 		"""
@@ -102,13 +267,110 @@ class Graph:
 		scorerank_for_all = 1.0
 		for team in self.nodes:
 			self.nodes[team].scorerank = scorerank_for_all
+		self.positions = None
+
+	def seed_scoreranks(self, source, default=1.0):
+		"""
+		Initialise scoreranks from an earlier graph or a {team: scorerank} mapping
+
+		Teams not found in source start at default, as in redistribute_scoreranks
+		"""
+		if isinstance(source, Graph):
+			source = dict((team, source.get_scorerank(team)) for team in source)
+		for team in self.nodes:
+			self.nodes[team].scorerank = source.get(team, default)
+		self.positions = None
+
+	def fill_scoreranks(self, default=1.0):
+		"""
+		Initialise scorerank of any node that does not have one yet (e.g. newly added)
+		"""
+		for team in self.nodes:
+			if self.nodes[team].scorerank is None:
+				self.nodes[team].scorerank = default
+		self.positions = None
+
+	def set_personalization(self, weights=None):
+		"""
+		Use weights for the random hop instead of 1.0 for every team (e.g. league tier, or last season's ranks)
+
+		weights is a {team: weight} mapping or an earlier graph (its scoreranks
+		used). Teams not found in weights get 1.0, and None goes back to the
+		uniform hop. Scoreranks add up to the total weight, so weights averaging 1
+		keep the same scale
+		"""
+		self.personalization = personalization_weights(weights)
+		self.hops = None
 
-	def iterate_scoreranks_n(self, N):
+	def hop_weights(self):
+		"""
+		Returns {team: random hop weight} for every node (1.0 unless personalised), kept until teams or weights change
+		"""
+		if self.hops is None:
+			weights = self.personalization or {}
+			self.hops = dict((team, weights.get(team, 1.0)) for team in self.nodes)
+		return self.hops
+
+	def iterate_scoreranks_n(self, N, record_history=False):
 		"""
 		Run scorerank iteration N times
+
+		If record_history, the scoreranks before and after each iteration are
+		written into a preallocated (N+1 x teams) array, kept as self.history
+		(see history_frame)
 		"""
-		for _ in range(N):
+		if record_history:
+			self.history = np.empty((N + 1, self.size))
+			self.history[0] = self.scorerank_vector()
+		for k in range(N):
 			self.iterate_scoreranks()
+			if record_history:
+				self.history[k + 1] = self.scorerank_vector()
+
+	def solve(self, tol=1e-6, max_iter=100, norm='l1', record_history=False):
+		"""
+		Run scorerank iterations until the change between iterations falls below tol
+
+		norm is 'l1' (sum of changes) or 'linf' (largest change). Stops after
+		max_iter iterations regardless, returns (iterations run, final residual).
+		record_history keeps every iteration's scoreranks, as iterate_scoreranks_n
+		(in a buffer doubled as needed, as most solves stop well before max_iter)
+		"""
+		previous = self.scorerank_vector()
+		if record_history:
+			history = np.empty((min(max_iter, 32) + 1, self.size))
+			history[0] = previous
+		residual = float('inf')
+		iterations = 0
+		while iterations < max_iter:
+			self.iterate_scoreranks()
+			iterations += 1
+			current = self.scorerank_vector()
+			if record_history:
+				if iterations == len(history):
+					history = np.concatenate([history, np.empty((min(len(history), max_iter + 1 - len(history)), self.size))])
+				history[iterations] = current
+			residual = scorerank_residual(previous, current, norm)
+			previous = current
+			if residual < tol:
+				break
+		self.iterations = iterations
+		self.residual = residual
+		if record_history:
+			self.history = history[:iterations + 1].copy() if iterations + 1 < len(history) else history  # don't keep the unused rows alive
+		return iterations, residual
+
+	def history_frame(self):
+		"""
+		Returns recorded scoreranks as a dataframe (rows = iterations, 0 being the start; columns = teams)
+		"""
+		return pd.DataFrame(self.history, columns=list(self)).rename_axis('Iteration')
+
+	def scorerank_vector(self):
+		"""
+		Returns array of all scoreranks (in node order)
+		"""
+		return np.array([self.nodes[team].scorerank for team in self.nodes], dtype=float)
 
 	def total_scorerank(self):
 		"""
@@ -140,7 +402,9 @@ class Graph:
 
 
 
-class Vertex:
+class Vertex(object):
+
+	__slots__ = ['team', 'scorerank', 'scorerank_updating', 'outgoing', 'incoming', 'outgoing_number', 'incoming_number']
 
 	def __init__(self, team):
 		self.team = team
@@ -165,7 +429,703 @@ class Vertex:
 		self.incoming_number += weight
 		self.incoming[team_from] = self.incoming.get(team_from, 0) + weight
 
+	def remove_outgoing(self, team_to, weight=1):
+		"""
+		Remove weight from an outgoing connection (connection dropped at 0)
+		"""
+		self.outgoing_number -= weight
+		self.outgoing[team_to] = self.outgoing.get(team_to, 0) - weight
+		if self.outgoing[team_to] == 0:
+			del self.outgoing[team_to]
+
+	def remove_incoming(self, team_from, weight=1):
+		"""
+		Remove weight from an incoming connection (connection dropped at 0)
+		"""
+		self.incoming_number -= weight
+		self.incoming[team_from] = self.incoming.get(team_from, 0) - weight
+		if self.incoming[team_from] == 0:
+			del self.incoming[team_from]
+
 	def __repr__(self):
 		return "Team: {}, Scorerank: {}, Out: {}, In: {}".format(
 			self.team, self.scorerank, self.outgoing_number, self.incoming_number
 			)
+
+
+
+class SparseGraph(Graph):
+	"""
+	Graph with the same API, but scoreranks held in a NumPy array
+
+	Teams get an integer index as they are added, the graph is compiled into a
+	sparse (CSR) transition matrix and each iteration is a single mat-vec
+	"""
+
+	def __init__(self, leak=0.2, debug=False):
+		Graph.__init__(self, leak, debug)
+		self.teams = []
+		self.team_index = {}
+		self.scoreranks = np.zeros(0)
+		self.matrix = None
+		self.positions_ranks = None  # scoreranks array self.positions was built from
+		self.teleport = None  # random hop weights as an array, built with the matrix
+		self.teleport_matrix = None  # matrix self.teleport was built with
+
+	def add_node(self, team, redistribute = False):
+		"""
+		Add a node to the graph, giving it the next free integer index
+		"""
+		if team not in self.team_index:
+			self.team_index[team] = len(self.teams)
+			self.teams.append(team)
+			self.scoreranks = np.append(self.scoreranks, np.nan)  # i.e. no scorerank yet
+			self.matrix = None
+		Graph.add_node(self, team, redistribute)
+
+	def add_nodes(self, teams):
+		"""
+		Add several nodes to the graph (scoreranks array extended once)
+		"""
+		new_teams = [team for team in teams if team not in self.team_index]
+		for team in new_teams:
+			self.team_index[team] = len(self.teams)
+			self.teams.append(team)
+		self.scoreranks = np.concatenate([self.scoreranks, np.repeat(np.nan, len(new_teams))])
+		self.matrix = None
+		Graph.add_nodes(self, new_teams)
+
+	def add_edge(self, team_from, team_to, weight):
+		"""
+		Add an edge between two teams (compiled matrix rebuilt on next iteration)
+		"""
+		Graph.add_edge(self, team_from, team_to, weight)
+		self.matrix = None
+
+	def remove_edge(self, team_from, team_to, weight):
+		"""
+		Remove weight from an edge between two teams
+		"""
+		Graph.remove_edge(self, team_from, team_to, weight)
+		self.matrix = None
+
+	def remove_node(self, team):
+		"""
+		Remove a node, shifting down the index of every team after it
+		"""
+		Graph.remove_node(self, team)
+		i = self.team_index.pop(team)
+		del self.teams[i]
+		self.scoreranks = np.delete(self.scoreranks, i)
+		for j in range(i, len(self.teams)):
+			self.team_index[self.teams[j]] = j
+		self.matrix = None
+
+	def scale_edges(self, factor):
+		"""
+		Multiply every edge weight by factor
+		"""
+		Graph.scale_edges(self, factor)
+		self.matrix = None
+
+	def transition_matrix(self):
+		"""
+		Return CSR matrix M where M[i,j] is the share of team j's scorerank sent to team i
+		"""
+		if self.matrix is not None:
+			return self.matrix
+		rows, cols, data = [], [], []
+		for j, team in enumerate(self.teams):
+			node = self.nodes[team]
+			if node.outgoing_number == 0:
+				continue
+			for nbr in node.outgoing:
+				rows.append(self.team_index[nbr.team])
+				cols.append(j)
+				data.append(node.outgoing[nbr] * 1.0 / node.outgoing_number)
+		self.matrix = sp.csr_matrix((data, (rows, cols)), shape=(self.size, self.size))
+		return self.matrix
+
+	def get_node(self, team_name):
+		"""
+		Return node with team name (its scorerank copied across from the array)
+		"""
+		node = self.nodes[team_name]
+		scorerank = self.scoreranks[self.team_index[team_name]]
+		node.scorerank = None if np.isnan(scorerank) else scorerank
+		return node
+
+	def get_scorerank(self, team_name):
+		"""
+		Return scorerank of team
+		"""
+		return self.scoreranks[self.team_index[team_name]]
+
+	def get_scoreranks(self):
+		scoreranks = zip(self.teams, self.scoreranks.tolist())
+		scoreranks.sort(key=lambda x: x[1], reverse=True)
+		return scoreranks
+
+	def get_position(self, team_name):
+		"""
+		Return position of team when ranked by scorerank (1 = highest), kept until the scoreranks change
+
+		Every change of scoreranks replaces the array, so the cached positions
+		are current as long as they were built from this array
+		"""
+		if self.positions_ranks is not self.scoreranks:
+			self.positions = None
+			self.positions_ranks = self.scoreranks
+		return Graph.get_position(self, team_name)
+
+	def ranked_teams(self):
+		"""
+		Returns (teams, array of their scoreranks) in team index order
+		"""
+		return self.teams, self.scoreranks
+
+	def scorerank_differences(self, home_teams, away_teams):
+		"""
+		Return (home minus away scorerank array, mask of fixtures with both teams ranked) for lists of fixtures
+		"""
+		return fixture_differences(self.team_index, self.scoreranks, home_teams, away_teams)
+
+	def iterate_scoreranks(self):
+		"""
+		Update all scoreranks by 1 iteration (one sparse mat-vec)
+		"""
+		M = self.transition_matrix()
+		self.scoreranks = (1-self.leak) * M.dot(self.scoreranks) + self.leak * self.teleport_vector()
+
+	def iterate_scoreranks_traced(self):
+		"""
+		Update all scoreranks by 1 iteration, logging the total (used when debug=True)
+		"""
+		SparseGraph.iterate_scoreranks(self)
+		logger.debug("Total scorerank after iterations: %s", self.total_scorerank())
+
+	def set_personalization(self, weights=None):
+		"""
+		Use weights for the random hop instead of 1.0 for every team (see Graph.set_personalization)
+		"""
+		Graph.set_personalization(self, weights)
+		self.teleport_matrix = None
+
+	def teleport_vector(self):
+		"""
+		Returns random hop weight of every team as an array (team index order), or 1.0 if not personalised
+
+		Rebuilt whenever the transition matrix is, so it follows teams being added or removed
+		"""
+		if self.personalization is None:
+			return 1.0
+		M = self.transition_matrix()
+		if self.teleport_matrix is not M:
+			self.teleport = personalization_matrix(self.teams, [self.personalization])[:, 0]
+			self.teleport_matrix = M
+		return self.teleport
+
+	def solve_personalized(self, personalizations, tol=1e-6, max_iter=100, norm='l1'):
+		"""
+		Solve scoreranks for several random hop weightings at once (one sparse mat-mat per iteration)
+
+		personalizations is a list of weights as for set_personalization (None
+		for the uniform hop). Every column starts from the current scoreranks (1
+		where missing) and iterations stop once each column's change is below
+		tol. Returns (teams x personalizations) array in team index order;
+		scoreranks stored on the graph are unchanged, iterations and residual are
+		kept as for solve
+		"""
+		M = self.transition_matrix()
+		teleport = personalization_matrix(self.teams, [personalization_weights(weights) for weights in personalizations])
+		ranks = np.repeat(np.where(np.isnan(self.scoreranks), 1.0, self.scoreranks)[:, None], teleport.shape[1], axis=1)
+		residual = float('inf')
+		iterations = 0
+		while iterations < max_iter:
+			updated = (1-self.leak) * M.dot(ranks) + self.leak * teleport
+			iterations += 1
+			residual = np.max(scorerank_residual(ranks, updated, norm)) if ranks.size else 0.0
+			ranks = updated
+			if residual < tol:
+				break
+		self.iterations = iterations
+		self.residual = residual
+		return ranks
+
+	def redistribute_scoreranks(self):
+		"""
+		Initialise all scoreranks as 1
+		"""
+		self.scoreranks = np.ones(self.size)
+
+	def seed_scoreranks(self, source, default=1.0):
+		"""
+		Initialise scoreranks from an earlier graph or a {team: scorerank} mapping
+
+		Teams not found in source start at default, as in redistribute_scoreranks
+		"""
+		if isinstance(source, SparseGraph):
+			source = dict(zip(source.teams, source.scoreranks))
+		elif isinstance(source, Graph):
+			source = dict((team, source.get_scorerank(team)) for team in source)
+		self.scoreranks = np.array([source.get(team, default) for team in self.teams], dtype=float)
+
+	def fill_scoreranks(self, default=1.0):
+		"""
+		Initialise scorerank of any node that does not have one yet (e.g. newly added)
+		"""
+		self.scoreranks = np.where(np.isnan(self.scoreranks), default, self.scoreranks)  # a new array, see get_position
+
+	def solve_leaks(self, leaks, iterations):
+		"""
+		Run scorerank for several leak values at once, starting from all scoreranks 1
+
+		Each iteration is one sparse mat-mat over a (teams x leaks) array. Returns
+		array of shape (iterations+1, teams, leaks) with the scoreranks after each
+		iteration, for every leak (scoreranks stored on the graph are unchanged)
+		"""
+		M = self.transition_matrix()
+		leaks = np.asarray(leaks, dtype=float)
+		history = np.empty((iterations + 1, self.size, len(leaks)))
+		history[0] = 1.0
+		for k in range(iterations):
+			history[k+1] = (1-leaks) * M.dot(history[k]) + leaks
+		return history
+
+	def scorerank_vector(self):
+		"""
+		Returns array of all scoreranks (in team index order)
+		"""
+		return self.scoreranks.copy()
+
+	def total_scorerank(self):
+		"""
+		Returns the sum of all scoreranks in the graph
+		"""
+		return self.scoreranks.sum()
+
+	def __iter__(self):
+		return iter(self.teams)  # team index order, as scorerank_vector
+
+
+class CompactGraph(SparseGraph):
+	"""
+	Graph with the same API, but no Vertex objects or dicts of edges
+
+	Teams are integer indices, edges are kept in flat arrays (team from, team
+	to, weight). Removing weight appends a negative entry, and the arrays are
+	compacted (repeat pairs summed, empty edges dropped) when compiling.
+	Nodes returned by get_node are built on demand
+	"""
+
+	def __init__(self, leak=0.2, debug=False):
+		SparseGraph.__init__(self, leak, debug)
+		self.nodes = None  # no Vertex objects, edges are in the arrays below
+		self.edge_from = array.array('i')
+		self.edge_to = array.array('i')
+		self.edge_weight = array.array('d')
+		self.outgoing_numbers = array.array('d')
+		self.incoming_numbers = array.array('d')
+
+	@classmethod
+	def from_matches(cls, home, away, home_goals, away_goals, leak=0.2, debug=False, teams=None):
+		"""
+		Create graph from whole columns/arrays of matches (as Graph.from_matches)
+		"""
+		teams, team_from, team_to, weights = match_edges(home, away, home_goals, away_goals, teams)
+		G = cls(leak=leak, debug=debug)
+		G.add_nodes(teams)
+		G.edge_from.fromlist(team_from.tolist())
+		G.edge_to.fromlist(team_to.tolist())
+		G.edge_weight.fromlist(weights.astype(float).tolist())
+		G.outgoing_numbers = array.array('d', np.bincount(team_from, weights=weights, minlength=len(teams)).tolist())
+		G.incoming_numbers = array.array('d', np.bincount(team_to, weights=weights, minlength=len(teams)).tolist())
+		return G
+
+	def add_node(self, team, redistribute = False):
+		"""
+		Add a node to the graph, giving it the next free integer index
+		"""
+		if team not in self.team_index:
+			self.add_nodes([team])
+		if redistribute:
+			self.redistribute_scoreranks()
+
+	def add_nodes(self, teams):
+		"""
+		Add several nodes to the graph
+		"""
+		new_teams = [team for team in teams if team not in self.team_index]
+		for team in new_teams:
+			self.team_index[team] = len(self.teams)
+			self.teams.append(team)
+		self.outgoing_numbers.extend([0.0] * len(new_teams))
+		self.incoming_numbers.extend([0.0] * len(new_teams))
+		self.scoreranks = np.concatenate([self.scoreranks, np.repeat(np.nan, len(new_teams))])
+		self.size = len(self.teams)
+		self.matrix = None
+
+	def add_edge(self, team_from, team_to, weight):
+		"""
+		Add an edge between two teams, with an associated weight (adds teams if not already present)
+		"""
+		for team in [team_from, team_to]:
+			if team not in self.team_index:
+				self.add_node(team)
+		i, j = self.team_index[team_from], self.team_index[team_to]
+		self.edge_from.append(i)
+		self.edge_to.append(j)
+		self.edge_weight.append(weight)
+		self.outgoing_numbers[i] += weight
+		self.incoming_numbers[j] += weight
+		self.matrix = None
+
+	def remove_edge(self, team_from, team_to, weight):
+		"""
+		Remove weight from an edge between two teams
+		"""
+		CompactGraph.add_edge(self, team_from, team_to, -weight)  # not self.add_edge, which may be wrapped (see SR_Profile)
+
+	def remove_node(self, team):
+		"""
+		Remove a node, along with any edges still attached to it, shifting down later indices
+		"""
+		i = self.team_index.pop(team)
+		self.compact_edges()
+		edge_from = np.frombuffer(self.edge_from, dtype=np.int32)
+		edge_to = np.frombuffer(self.edge_to, dtype=np.int32)
+		edge_weight = np.frombuffer(self.edge_weight)
+		keep = (edge_from != i) & (edge_to != i)
+		outgoing_numbers = np.bincount(edge_from[keep], weights=edge_weight[keep], minlength=self.size)
+		incoming_numbers = np.bincount(edge_to[keep], weights=edge_weight[keep], minlength=self.size)
+		edge_from, edge_to, edge_weight = edge_from[keep], edge_to[keep], edge_weight[keep]
+		self.edge_from = array.array('i', (edge_from - (edge_from > i)).tolist())
+		self.edge_to = array.array('i', (edge_to - (edge_to > i)).tolist())
+		self.edge_weight = array.array('d', edge_weight.tolist())
+		self.outgoing_numbers = array.array('d', np.delete(outgoing_numbers, i).tolist())
+		self.incoming_numbers = array.array('d', np.delete(incoming_numbers, i).tolist())
+		del self.teams[i]
+		for j in range(i, len(self.teams)):
+			self.team_index[self.teams[j]] = j
+		self.scoreranks = np.delete(self.scoreranks, i)
+		self.size -= 1
+		self.matrix = None
+
+	def scale_edges(self, factor):
+		"""
+		Multiply every edge weight by factor
+		"""
+		self.edge_weight = array.array('d', (np.frombuffer(self.edge_weight) * factor).tolist())
+		self.outgoing_numbers = array.array('d', (np.frombuffer(self.outgoing_numbers) * factor).tolist())
+		self.incoming_numbers = array.array('d', (np.frombuffer(self.incoming_numbers) * factor).tolist())
+		self.matrix = None
+
+	def compact_edges(self):
+		"""
+		Sum repeat entries for each pair of teams and drop edges with no weight left
+		"""
+		if len(self.edge_weight) == 0:
+			return
+		E = sp.coo_matrix((np.frombuffer(self.edge_weight), (np.frombuffer(self.edge_from, dtype=np.int32),
+			np.frombuffer(self.edge_to, dtype=np.int32))), shape=(self.size, self.size)).tocsr()
+		E.eliminate_zeros()
+		E = E.tocoo()
+		self.edge_from = array.array('i', E.row.tolist())
+		self.edge_to = array.array('i', E.col.tolist())
+		self.edge_weight = array.array('d', E.data.tolist())
+
+	def transition_matrix(self):
+		"""
+		Return CSR matrix M where M[i,j] is the share of team j's scorerank sent to team i
+		"""
+		if self.matrix is not None:
+			return self.matrix
+		self.compact_edges()
+		edge_from = np.frombuffer(self.edge_from, dtype=np.int32)
+		share = np.frombuffer(self.edge_weight) / np.frombuffer(self.outgoing_numbers)[edge_from]
+		self.matrix = sp.csr_matrix((share, (np.frombuffer(self.edge_to, dtype=np.int32), edge_from)),
+			shape=(self.size, self.size))
+		return self.matrix
+
+	def get_node(self, team_name):
+		"""
+		Return a Vertex built from the edge arrays (a copy: changing it does not change the graph)
+		"""
+		self.compact_edges()
+		i = self.team_index[team_name]
+		node = Vertex(team_name)
+		scorerank = self.scoreranks[i]
+		node.scorerank = None if np.isnan(scorerank) else scorerank
+		for j, k, weight in zip(self.edge_from, self.edge_to, self.edge_weight):
+			if j == i:
+				node.outgoing[Vertex(self.teams[k])] = weight
+			if k == i:
+				node.incoming[Vertex(self.teams[j])] = weight
+		node.outgoing_number = self.outgoing_numbers[i]
+		node.incoming_number = self.incoming_numbers[i]
+		return node
+
+	def print_graph(self):
+		"""
+		Prints all nodes and connections in the graph
+		"""
+		for team in self.teams:
+			node = self.get_node(team)
+			print node
+			print "  Out:"
+			for subnode in node.outgoing:
+				print "  - {} ({})".format(subnode.team, node.outgoing[subnode])
+			print "  In:"
+			for subnode in node.incoming:
+				print "  - {} ({})".format(subnode.team, node.incoming[subnode])
+
+	def __iter__(self):
+		return iter(self.teams)
+
+
+class HomeAwayGraph(CompactGraph):
+	"""
+	CompactGraph with separate home and away layers: each team is two nodes, (team, 'home') and (team, 'away')
+
+	A team's home node gains from the away nodes of the teams it scores
+	against at home, and its away node from the home nodes of the teams it
+	scores against away. Both layers are solved together as one stacked sparse
+	system, with coupling the share of each node's scorerank passed to the same
+	team's other node, so a team's home and away strength still inform each
+	other (coupling=0 keeps the layers apart but for the edges between them)
+	"""
+
+	def __init__(self, leak=0.2, debug=False, coupling=0.5):
+		CompactGraph.__init__(self, leak, debug)
+		self.coupling = coupling
+
+	@classmethod
+	def from_matches(cls, home, away, home_goals, away_goals, leak=0.2, debug=False, teams=None, coupling=0.5):
+		"""
+		Create graph from whole columns/arrays of matches, all home nodes first then all away nodes
+
+		Teams are numbered as match_codes
+		"""
+		teams, codes = match_codes(home, away, teams)
+		n = len(teams)
+		G = cls(leak=leak, debug=debug, coupling=coupling)
+		G.add_nodes([(team, 'home') for team in teams])
+		team_from = np.concatenate([n + codes[:, 1], codes[:, 0]])  # home team's goals come from the away node
+		team_to = np.concatenate([codes[:, 0], n + codes[:, 1]])
+		weights = np.concatenate([np.asarray(home_goals), np.asarray(away_goals)]).astype(float)
+		G.edge_from.fromlist(team_from.tolist())
+		G.edge_to.fromlist(team_to.tolist())
+		G.edge_weight.fromlist(weights.tolist())
+		G.outgoing_numbers = array.array('d', np.bincount(team_from, weights=weights, minlength=2 * n).tolist())
+		G.incoming_numbers = array.array('d', np.bincount(team_to, weights=weights, minlength=2 * n).tolist())
+		return G
+
+	def add_match(self, home_team, away_team, home_goals, away_goals):
+		"""
+		Add a match: home team's goals to its home node, away team's goals to its away node
+		"""
+		self.add_edge((away_team, 'away'), (home_team, 'home'), home_goals)
+		self.add_edge((home_team, 'home'), (away_team, 'away'), away_goals)
+
+	def remove_match(self, home_team, away_team, home_goals, away_goals):
+		"""
+		Remove a match added with add_match
+		"""
+		self.remove_edge((away_team, 'away'), (home_team, 'home'), home_goals)
+		self.remove_edge((home_team, 'home'), (away_team, 'away'), away_goals)
+
+	def add_nodes(self, teams):
+		"""
+		Add (team, side) nodes, always both of a team's nodes: all the home nodes, then all the away nodes
+		"""
+		names, seen = [], set()
+		for team, _ in teams:
+			if team not in seen:
+				seen.add(team)
+				names.append(team)
+		CompactGraph.add_nodes(self, [(team, 'home') for team in names] + [(team, 'away') for team in names])
+
+	def remove_node(self, team):
+		"""
+		Remove both of a team's nodes (given the team name), along with their edges
+		"""
+		if isinstance(team, tuple):
+			raise TypeError("remove_node takes a team name, not a (team, side) node: {}".format(team))
+		for node in [(team, 'home'), (team, 'away')]:
+			CompactGraph.remove_node(self, node)
+
+	def scorerank_differences(self, home_teams, away_teams):
+		"""
+		Return (home team's home minus away team's away scorerank, mask of fixtures with both ranked), given team names
+		"""
+		home_nodes = [(team, 'home') for team in home_teams]
+		away_nodes = [(team, 'away') for team in away_teams]
+		return fixture_differences(self.team_index, self.scoreranks, home_nodes, away_nodes)
+
+	def transition_matrix(self):
+		"""
+		Return CSR matrix of both layers, with coupling share of every node's scorerank sent to its team's other node
+		"""
+		if self.matrix is not None:
+			return self.matrix
+		layers = CompactGraph.transition_matrix(self)
+		other = np.array([self.team_index[(team, 'away' if side == 'home' else 'home')] for team, side in self.teams], dtype=int)
+		swap = sp.csr_matrix((np.ones(self.size), (other, np.arange(self.size))), shape=(self.size, self.size))
+		self.matrix = ((1 - self.coupling) * layers + self.coupling * swap).tocsr()
+		return self.matrix
+
+	def home_away_scoreranks(self, scoreranks=None):
+		"""
+		Returns dataframe of each team's home and away scorerank (columns Home, Away)
+
+		From the graph's scoreranks, or an array in team index order (e.g. a
+		column of solve_personalized)
+		"""
+		scoreranks = self.scoreranks if scoreranks is None else np.asarray(scoreranks)
+		names = [team for team, side in self.teams if side == 'home']
+		home = [self.team_index[(team, 'home')] for team in names]
+		away = [self.team_index[(team, 'away')] for team in names]
+		return pd.DataFrame({'Home': scoreranks[home], 'Away': scoreranks[away]},
+			index=pd.Index(names, name='Team'), columns=['Home', 'Away'])
+
+	def __repr__(self):
+		return "Home/away graph with {} teams".format(self.size // 2)
+
+
+def match_codes(home, away, teams=None):
+	"""
+	Factorise matches into (teams, codes): codes[:, 0] home and codes[:, 1] away team numbers
+
+	Teams are numbered in the order add_edge would see them (interleaved
+	home/away), or by their position in teams if given (e.g. grouped by league,
+	see SR_League)
+	"""
+	names = np.column_stack([np.asarray(home, dtype=object), np.asarray(away, dtype=object)]).ravel()
+	if teams is None:
+		teams, first_seen, codes = np.unique(names, return_index=True, return_inverse=True)
+		order = np.argsort(first_seen)
+		position = np.empty_like(order)
+		position[order] = np.arange(len(order))
+		teams = teams[order]
+		codes = position[codes].reshape(-1, 2)
+	else:
+		teams = np.asarray(teams, dtype=object)
+		sorter = np.argsort(teams)
+		codes = sorter[np.minimum(np.searchsorted(teams, names, sorter=sorter), len(teams) - 1)]
+		missing = teams[codes] != names
+		if missing.any():
+			raise KeyError("Teams not in team list: {}".format(sorted(set(names[missing]))))
+		codes = codes.reshape(-1, 2)
+	return teams, codes
+
+
+def match_edges(home, away, home_goals, away_goals, teams=None):
+	"""
+	Factorise matches into (teams, team_from, team_to, weights) arrays
+
+	Teams are numbered as match_codes. Edges go from conceding to scoring team
+	weighted by goals, with repeat pairings summed into one edge
+	"""
+	teams, codes = match_codes(home, away, teams)
+	team_from = np.concatenate([codes[:, 0], codes[:, 1]])
+	team_to = np.concatenate([codes[:, 1], codes[:, 0]])
+	goals = np.concatenate([np.asarray(away_goals), np.asarray(home_goals)]).astype(int)
+
+	pairs, pair_codes = np.unique(team_from * len(teams) + team_to, return_inverse=True)
+	weights = np.bincount(pair_codes, weights=goals).astype(int)
+	return teams, pairs // len(teams), pairs % len(teams), weights
+
+
+def fixture_differences(team_index, scoreranks, home_teams, away_teams, away_index=None):
+	"""
+	Returns (home minus away scorerank, mask of fixtures where both teams have one) as arrays
+
+	team_index maps each team to its position in the scoreranks array (away
+	teams looked up in away_index instead if given, e.g. a HomeAwayGraph's away
+	nodes); teams not in it (or not yet ranked) give NaN differences
+	"""
+	if away_index is None:
+		away_index = team_index
+	scoreranks = np.append(scoreranks, np.nan)  # unknown teams index the NaN at the end
+	home = np.array([team_index.get(team, -1) for team in home_teams], dtype=int)
+	away = np.array([away_index.get(team, -1) for team in away_teams], dtype=int)
+	differences = scoreranks[home] - scoreranks[away]
+	return differences, ~np.isnan(differences)
+
+
+def top_indices(scoreranks, k, lowest=False):
+	"""
+	Returns indices of the k highest (or lowest) scoreranks in order, using a partition rather than a full sort
+
+	Teams without a scorerank (NaN) come last
+	"""
+	scoreranks = np.asarray(scoreranks, dtype=float)
+	keys = scoreranks if lowest else -scoreranks
+	k = min(k, len(keys))
+	if k <= 0:
+		return np.zeros(0, dtype=int)
+	if k < len(keys):
+		candidates = np.sort(np.argpartition(keys, k - 1)[:k])  # ties stay in team order
+	else:
+		candidates = np.arange(len(keys))
+	return candidates[np.argsort(keys[candidates], kind='mergesort')]
+
+
+def personalization_weights(weights):
+	"""
+	Returns random hop weights as a {team: weight} mapping (or None): an earlier graph gives its scoreranks
+
+	Teams the graph has not ranked yet are left out, so get the uniform 1.0
+	"""
+	if isinstance(weights, Graph):
+		teams, scoreranks = weights.ranked_teams()
+		return dict((team, scorerank) for team, scorerank in zip(teams, np.asarray(scoreranks).tolist()) if not np.isnan(scorerank))
+	return weights
+
+
+def personalization_matrix(teams, personalizations):
+	"""
+	Returns (teams x personalizations) array of random hop weights, 1.0 for teams not given (or None weights)
+	"""
+	weights = [[1.0 if personalization is None else personalization.get(team, 1.0) for personalization in personalizations]
+		for team in teams]
+	return np.array(weights, dtype=float).reshape(len(teams), len(personalizations))
+
+
+def scorerank_residual(previous, current, norm='l1'):
+	"""
+	Returns size of change between two scorerank vectors, using 'l1' or 'linf' norm
+
+	For (teams x columns) arrays, returns the change of each column
+	"""
+	change = np.abs(current - previous)
+	if len(change) == 0:
+		return 0.0
+	if norm == 'l1':
+		return change.sum(axis=0)
+	if norm == 'linf':
+		return change.max(axis=0)
+	raise ValueError("Unknown norm '{}', use 'l1' or 'linf'".format(norm))
+
+
+def max_scorerank_difference(graph_a, graph_b):
+	"""
+	Returns largest absolute difference in scorerank between two graphs over the same teams
+	"""
+	return max(abs(graph_a.get_scorerank(team) - graph_b.get_scorerank(team)) for team in graph_a)
+
+
+if __name__ == '__main__':
+
+	# Check the sparse engine agrees with the dict engine on a full season
+	import pandas as pd
+	df = pd.read_csv('2014.csv')
+	G_dict = Graph(leak=0.2)
+	G_sparse = SparseGraph(leak=0.2)
+	for G in [G_dict, G_sparse]:
+		for home_team, away_team, home_score, away_score in zip(df['HomeTeam'], df['AwayTeam'], df['FTHG'], df['FTAG']):
+			G.add_edge(team_from = home_team, team_to = away_team, weight = int(away_score))
+			G.add_edge(team_from = away_team, team_to = home_team, weight = int(home_score))
+		G.redistribute_scoreranks()
+		G.iterate_scoreranks_n(20)
+	print "Max difference between dict and sparse engines: {}".format(max_scorerank_difference(G_dict, G_sparse))
@@ -0,0 +1,167 @@
+# Ranking clubs across several divisions/competitions in one graph
+# e.g. python SR_League.py E0.csv E1.csv E2.csv SP1.csv D1.csv
+
+import sys
+import time
+import numpy as np
+import scipy.sparse as sp
+from scipy.sparse import csgraph
+import SR_Graph
+import SR_Data
+
+
+def team_divisions(home, away, divisions):
+	"""
+	Returns {team: division it played most matches in} (clubs may move division between seasons)
+	"""
+	counts = {}
+	for teams in [home, away]:
+		for team, division in zip(teams, divisions):
+			team_counts = counts.setdefault(team, {})
+			team_counts[division] = team_counts.get(division, 0) + 1
+	return dict((team, max(sorted(team_counts), key=team_counts.get)) for team, team_counts in counts.items())
+
+
+def partition_teams(home, away, divisions=None):
+	"""
+	Returns (teams, partitions): team IDs ordered so each partition's teams are consecutive
+
+	A team's partition is its main division if divisions (one per match, e.g.
+	the Div column) are given, otherwise its connected component of the match
+	graph. partitions[i] is the partition number of teams[i], numbered in order
+	"""
+	names = np.concatenate([np.asarray(home, dtype=object), np.asarray(away, dtype=object)])
+	all_teams, codes = np.unique(names, return_inverse=True)
+	if divisions is None:
+		n = len(all_teams)
+		links = sp.coo_matrix((np.ones(len(names) // 2), (codes[:len(names) // 2], codes[len(names) // 2:])), shape=(n, n))
+		_, labels = csgraph.connected_components(links, directed=False)
+	else:
+		division_of = team_divisions(home, away, divisions)
+		division_names = sorted(set(division_of.values()))
+		labels = np.array([division_names.index(division_of[team]) for team in all_teams])
+	order = np.argsort(labels, kind='mergesort')  # by partition, then name
+	_, partitions = np.unique(labels[order], return_inverse=True)
+	return all_teams[order].tolist(), partitions
+
+
+def build_graph(home, away, home_goals, away_goals, divisions=None, leak=0.2, graph_class=SR_Graph.CompactGraph):
+	"""
+	Create graph with partition-aware team IDs, returns (graph, partitions) (see partition_teams)
+	"""
+	teams, partitions = partition_teams(home, away, divisions)
+	G = graph_class.from_matches(home, away, home_goals, away_goals, leak=leak, teams=teams)
+	return G, partitions
+
+
+def block_system(M, partitions, leak, max_block=64):
+	"""
+	Split transition matrix M into exactly solvable blocks and the coupling left between them
+
+	Each partition of up to max_block teams is one block: its within-partition
+	edges give a dense system (I - (1-leak) M_block), inverted once. Teams of
+	larger partitions are blocks of their own, so their edges are iterated as
+	in a normal solve. Blocks of the same size are inverted as one stack.
+	Returns (groups, coupling): groups is a list of (teams, stack of inverses)
+	for each block size, teams in block order, and coupling the CSR matrix of
+	all edges between blocks
+	"""
+	M = M.tocsr()
+	n = len(partitions)
+	sizes = np.bincount(np.unique(partitions, return_inverse=True)[1])
+	small = np.repeat(sizes <= max_block, sizes)
+	first = ~small | np.concatenate([[True], partitions[1:] != partitions[:-1]])
+	block = np.cumsum(first) - 1
+	block_starts = np.flatnonzero(first)
+	block_sizes = np.diff(np.append(block_starts, n))
+	local = np.arange(n) - block_starts[block]
+	rows = np.repeat(np.arange(n), np.diff(M.indptr))
+	inside = block[rows] == block[M.indices]
+	coupling = sp.csr_matrix((np.where(inside, 0.0, M.data), M.indices.copy(), M.indptr.copy()), shape=M.shape)
+	coupling.eliminate_zeros()
+
+	rows, cols, data = rows[inside], M.indices[inside], M.data[inside]
+	edge_blocks = block[rows]
+	groups = []
+	for size in np.unique(block_sizes).tolist():
+		in_group = block_sizes == size
+		slot = np.cumsum(in_group) - 1  # position of each block in this group's stack
+		teams = np.flatnonzero(in_group[block])  # already in block order, as teams of a block are consecutive
+		if in_group.all():
+			edges = slice(None)  # e.g. every division the same size
+		else:
+			edges = in_group[edge_blocks]
+		cells = (slot[edge_blocks[edges]] * size + local[rows[edges]]) * size + local[cols[edges]]
+		system = -(1-leak) * np.bincount(cells, weights=data[edges], minlength=in_group.sum() * size * size)
+		system = system.reshape(-1, size, size)
+		system[:, np.arange(size), np.arange(size)] += 1.0
+		groups.append((teams, np.linalg.inv(system)))
+	return groups, coupling
+
+
+def solve_blocks(groups, incoming):
+	"""
+	Returns scoreranks solving every block exactly, given the scorerank arriving from outside it (incl. random hop)
+	"""
+	ranks = np.empty(len(incoming))
+	for teams, inverses in groups:
+		ranks[teams] = np.matmul(inverses, incoming[teams].reshape(len(inverses), -1, 1)).ravel()
+	return ranks
+
+
+def solve_partitioned(G, partitions, tol=1e-6, max_iter=100, max_block=64):
+	"""
+	Solve scoreranks of the whole graph, with each partition's block solved exactly at every iteration
+
+	Block Jacobi: only the scorerank crossing between partitions is iterated,
+	starting from the current ranks, so loosely connected leagues converge in
+	a few iterations. Only partitions of up to max_block teams (e.g. divisions)
+	are solved as blocks, so disconnected components (the default partitions
+	of build_graph) converge in one iteration only if none is larger; teams of
+	larger partitions are iterated one by one, and if they hold half the teams
+	or more this is just G.solve (as many iterations). Uses the graph's random hop
+	weights (see set_personalization). For the sparse engines (SparseGraph,
+	CompactGraph), with teams numbered by partition (see build_graph).
+	Returns (iterations, residual) as G.solve, residual being the change one
+	more plain iteration would make
+	"""
+	partitions = np.asarray(partitions)
+	if np.any(np.diff(partitions) < 0):
+		raise ValueError("Teams must be numbered by partition (see build_graph)")
+	G.fill_scoreranks()
+	M = G.transition_matrix()
+	sizes = np.bincount(np.unique(partitions, return_inverse=True)[1])
+	if sizes[sizes > max_block].sum() * 2 >= G.size:
+		return G.solve(tol=tol, max_iter=max_iter)
+	groups, coupling = block_system(M, partitions, G.leak, max_block)
+	hop = G.leak * G.teleport_vector() * np.ones(G.size)
+	incoming = (1-G.leak) * coupling.dot(G.scorerank_vector())
+	residual = float('inf')
+	iterations = 0
+	while iterations < max_iter:
+		ranks = solve_blocks(groups, incoming + hop)
+		iterations += 1
+		# Ranks solve their blocks exactly, so a plain iteration would only change them by the change in incoming
+		updated = (1-G.leak) * coupling.dot(ranks)
+		residual = SR_Graph.scorerank_residual(incoming, updated)
+		incoming = updated
+		if residual < tol:
+			break  # at once if there is no coupling: the blocks are already the solution
+	G.scoreranks = ranks
+	G.iterations = iterations
+	G.residual = residual
+	return iterations, residual
+
+
+if __name__ == '__main__':
+
+	# Rank every club in the given league CSVs together
+	csv_list = sys.argv[1:] or ['2014.csv']
+	df = SR_Data.load_matches(csv_list)
+	G, partitions = build_graph(df['HomeTeam'], df['AwayTeam'], df['FTHG'], df['FTAG'], divisions=df['Div'])
+	start = time.time()
+	iterations, residual = solve_partitioned(G, partitions)
+	print "{} clubs in {} partitions solved in {:.3f}s ({} iterations, residual {:.2g})".format(
+		G.size, partitions.max() + 1, time.time() - start, iterations, residual)
+	for team, scorerank in G.get_scoreranks()[:20]:
+		print "  {:<24}{:.3f}".format(team, scorerank)
@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+
+
+# Bookmaker column prefixes in the football-data CSVs, each with H/D/A odds columns
+# (BbMx/BbAv are the maximum/average over all bookmakers on BetBrain)
+BOOKMAKERS = ['B365', 'BW', 'GB', 'IW', 'LB', 'PS', 'WH', 'SJ', 'VC', 'BS', 'BbMx', 'BbAv']
+
+
+def odds_columns(bookmakers=BOOKMAKERS):
+	"""
+	Returns list of home/draw/away odds column names for each bookmaker
+	"""
+	return [bookmaker + outcome for bookmaker in bookmakers for outcome in ['H', 'D', 'A']]
+
+
+def available_bookmakers(df, bookmakers=BOOKMAKERS):
+	"""
+	Returns the bookmakers with all three odds columns in the dataframe
+	"""
+	return [bookmaker for bookmaker in bookmakers if all(column in df for column in odds_columns([bookmaker]))]
+
+
+def implied_predictions(df, bookmakers=None):
+	"""
+	Convert odds for each bookmaker into a number from -1 to 1, in one pass over all matches
+
+	As bookie_calculator: implied probabilities normalised to remove the
+	bookmaker's margin, then home minus away. Returns dataframe with one column
+	per bookmaker (NaN where a bookmaker has no odds for a match)
+	"""
+	if bookmakers is None:
+		bookmakers = available_bookmakers(df)
+	odds = df[odds_columns(bookmakers)].values.astype(float).reshape(len(df), len(bookmakers), 3)
+	implied = 1.0 / odds
+	implied /= implied.sum(axis=2)[:, :, np.newaxis]
+	return pd.DataFrame(implied[:, :, 0] - implied[:, :, 2], index=df.index, columns=bookmakers)
+
+
+def consensus(predictions, how='median'):
+	"""
+	Combine per-bookmaker predictions into one per match ('median' or 'mean', ignoring NaN)
+	"""
+	if how == 'median':
+		return predictions.median(axis=1)
+	if how == 'mean':
+		return predictions.mean(axis=1)
+	raise ValueError("Unknown consensus '{}', use 'median' or 'mean'".format(how))
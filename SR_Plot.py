@@ -0,0 +1,127 @@
+# Circular ScoreRank graph plots drawn straight from the graph's edge arrays (no networkx)
+# e.g. python SR_Plot.py 2014.csv --output frames    (one PNG per matchday, headless)
+
+import os
+import argparse
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.collections import LineCollection
+from matplotlib.colors import to_rgba_array
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+import SR_Graph
+import SR_Window
+import SR_Data
+import SR_Snapshot
+
+
+# Edge style for edges of weight 1, 2, ... 7 or more goals: (width, alpha, colour)
+EDGE_STYLES = [
+	(1, 0.2, '#9999dd'),
+	(1.5, 0.3, '#7788bb'),
+	(2, 0.4, '#6666aa'),
+	(2.5, 0.5, '#336699'),
+	(3, 0.6, '#225577'),
+	(3, 0.65, '#113355'),
+	(3.5, 0.65, '#111111'),
+]
+
+
+def circular_positions(n):
+	"""
+	Returns (n, 2) array of points evenly spaced around the unit circle (as networkx circular_layout)
+	"""
+	theta = np.arange(n) * 2 * np.pi / max(n, 1)
+	return np.column_stack([np.cos(theta), np.sin(theta)])
+
+
+def edge_collection(positions, team_from, team_to, weights):
+	"""
+	Returns one LineCollection of all edges, styled by weight bucket (edges under 1 goal not drawn)
+
+	Buckets are found once for all edges; lighter buckets are drawn first so heavy edges are on top
+	"""
+	weights = np.asarray(weights)
+	drawn = weights >= 1
+	team_from, team_to = np.asarray(team_from)[drawn], np.asarray(team_to)[drawn]
+	buckets = np.minimum(weights[drawn].astype(int), len(EDGE_STYLES)) - 1
+	order = np.argsort(buckets, kind='mergesort')
+	team_from, team_to, buckets = team_from[order], team_to[order], buckets[order]
+	widths = np.array([width for width, _, _ in EDGE_STYLES])
+	colors = to_rgba_array([color for _, _, color in EDGE_STYLES])
+	colors[:, 3] = [alpha for _, alpha, _ in EDGE_STYLES]
+	segments = np.stack([positions[team_from], positions[team_to]], axis=1)
+	return LineCollection(segments, linewidths=widths[buckets], colors=colors[buckets])
+
+
+def plot_graph(G, ax, title=None):
+	"""
+	Draw graph on a matplotlib axes: teams around a circle in scorerank order, sized by scorerank
+
+	Works for any engine, from its edge arrays (see SR_Snapshot.graph_arrays)
+	"""
+	teams, team_from, team_to, weights, scoreranks = SR_Snapshot.graph_arrays(G)
+	order = np.argsort(-scoreranks, kind='mergesort')
+	position_of = np.empty(len(order), dtype=int)
+	position_of[order] = np.arange(len(order))
+	positions = circular_positions(len(teams))
+
+	# Edges as a single collection, then nodes (NB exponential to highlight differences visually) and labels on top
+	ax.add_collection(edge_collection(positions, position_of[team_from], position_of[team_to], weights))
+	node_sizes = (scoreranks[order]**2.9) * 1200
+	node_colors = [(0.5, (x * (1.0 / node_sizes.max()))**0.3, 0.5) for x in node_sizes]
+	ax.scatter(positions[:, 0], positions[:, 1], s=node_sizes, c=node_colors, zorder=2)
+	for team, (x, y) in zip(teams[order], positions):
+		ax.text(x, y, team, fontsize=8, family='sans-serif', ha='center', va='center', zorder=3)
+	ax.set_xlim(-1.2, 1.2)
+	ax.set_ylim(-1.2, 1.2)
+	ax.set_aspect('equal')
+	ax.set_axis_off()
+	if title:
+		ax.set_title(title)
+	return ax
+
+
+def export_matchdays(matches, directory, window_size=380, iterations=20, tol=1e-6, figsize=(8, 8), dpi=100):
+	"""
+	Save one PNG per matchday of the graph over the last window_size matches, rendered headless (Agg)
+
+	matches is a dataframe with Date, HomeTeam, AwayTeam, FTHG, FTAG sorted by
+	date. The graph is updated by a rolling window rather than rebuilt, and one
+	figure is reused for every image. Returns list of files written
+	"""
+	if not os.path.exists(directory):
+		os.makedirs(directory)
+	window = SR_Window.RollingWindow(size=window_size, graph_class=SR_Graph.CompactGraph)
+	dates = matches['Date'].values
+	home, away = matches['HomeTeam'].astype(object).values, matches['AwayTeam'].astype(object).values
+	home_goals, away_goals = matches['FTHG'].values, matches['FTAG'].values
+	figure = Figure(figsize=figsize, dpi=dpi)
+	canvas = FigureCanvasAgg(figure)
+	filenames = []
+	boundaries = np.flatnonzero(np.concatenate([dates[1:] != dates[:-1], [True]])) + 1
+	start = 0
+	for end in boundaries:
+		window.add_matches(zip(home[start:end], away[start:end], home_goals[start:end], away_goals[start:end]))
+		G = window.solve(iterations=iterations, tol=tol)
+		day = str(dates[start])[:10]
+		figure.clf()
+		plot_graph(G, figure.add_subplot(111), title='ScoreRank after {}'.format(day))
+		filename = os.path.join(directory, 'scorerank_{}.png'.format(day))
+		canvas.print_png(filename)
+		filenames.append(filename)
+		start = end
+	return filenames
+
+
+if __name__ == '__main__':
+
+	parser = argparse.ArgumentParser(description='Render the ScoreRank graph after every matchday')
+	parser.add_argument('csv_files', nargs='*', help='season CSVs')
+	parser.add_argument('--output', default='frames', help='directory to write images to')
+	parser.add_argument('--window', type=int, default=380, help='matches in the rolling graph')
+	args = parser.parse_args()
+
+	df = SR_Data.load_matches(args.csv_files or ['2014.csv'], columns=['Date', 'HomeTeam', 'AwayTeam', 'FTHG', 'FTAG'])
+	df = df.iloc[np.argsort(df['Date'].values, kind='mergesort')]
+	filenames = export_matchdays(df, args.output, window_size=args.window)
+	print "Wrote {} images to {}".format(len(filenames), args.output)
@@ -0,0 +1,140 @@
+import sys
+import time
+import pstats
+import cProfile
+import contextlib
+
+
+class Stats:
+	"""
+	Per-stage timers and counters for a run (e.g. a backtest), printed as a summary table
+
+	Only created when instrumentation is wanted: code being measured takes
+	stats=None by default and skips all timing, so there is nothing to pay
+	when it is off
+	"""
+
+	def __init__(self):
+		self.stages = []  # in the order first timed
+		self.times = {}
+		self.calls = {}
+		self.counters = {}
+		self.values = {}
+
+	def add_time(self, stage, seconds, calls=1):
+		"""
+		Add seconds spent in stage
+		"""
+		if stage not in self.times:
+			self.stages.append(stage)
+			self.times[stage] = 0.0
+			self.calls[stage] = 0
+		self.times[stage] += seconds
+		self.calls[stage] += calls
+
+	@contextlib.contextmanager
+	def timer(self, stage):
+		"""
+		Context manager adding the time spent inside it to stage
+		"""
+		start = time.time()
+		try:
+			yield
+		finally:
+			self.add_time(stage, time.time() - start)
+
+	def count(self, name, n=1):
+		"""
+		Add n to counter
+		"""
+		self.counters[name] = self.counters.get(name, 0) + n
+
+	def record(self, name, value):
+		"""
+		Record one observation of a value (e.g. a residual), summarised as count/min/mean/max
+		"""
+		self.values.setdefault(name, []).append(value)
+
+	def summary(self):
+		"""
+		Returns table of stage times, counters and recorded values as a string
+		"""
+		total = sum(self.times.values())
+		lines = ["{:<24}{:>10}{:>10}{:>14}{:>8}".format('Stage', 'Calls', 'Seconds', 'Per call (ms)', '%')]
+		for stage in self.stages:
+			seconds, calls = self.times[stage], self.calls[stage]
+			lines.append("{:<24}{:>10}{:>10.3f}{:>14.4f}{:>8.1f}".format(
+				stage, calls, seconds, seconds * 1000.0 / calls if calls else 0, seconds * 100.0 / total if total else 0))
+		if self.counters:
+			lines.append("")
+			lines.append("{:<24}{:>10}".format('Counter', 'Total'))
+			for name in sorted(self.counters):
+				lines.append("{:<24}{:>10}".format(name, self.counters[name]))
+		if self.values:
+			lines.append("")
+			lines.append("{:<24}{:>10}{:>12}{:>12}{:>12}".format('Value', 'Count', 'Min', 'Mean', 'Max'))
+			for name in sorted(self.values):
+				values = self.values[name]
+				lines.append("{:<24}{:>10}{:>12.3g}{:>12.3g}{:>12.3g}".format(
+					name, len(values), min(values), sum(values) / len(values), max(values)))
+		return "\n".join(lines)
+
+
+def instrument_graph(G, stats):
+	"""
+	Count edges added/removed, iterations, matrix builds and solve residuals of one graph into stats
+
+	Wraps the methods on this graph object only (as debug=True swaps in the
+	traced iteration), so graphs that are not instrumented are unchanged
+	"""
+	add_edge, remove_edge, iterate_scoreranks, solve = G.add_edge, G.remove_edge, G.iterate_scoreranks, G.solve
+
+	def counted_add_edge(team_from, team_to, weight):
+		stats.count('edges added')
+		add_edge(team_from, team_to, weight)
+
+	def counted_remove_edge(team_from, team_to, weight):
+		stats.count('edges removed')
+		remove_edge(team_from, team_to, weight)
+
+	def counted_iterate_scoreranks():
+		stats.count('iterations')
+		iterate_scoreranks()
+
+	def recorded_solve(*args, **kwargs):
+		iterations, residual = solve(*args, **kwargs)
+		stats.record('solve iterations', iterations)
+		stats.record('solve residual', residual)
+		return iterations, residual
+
+	G.add_edge = counted_add_edge
+	G.remove_edge = counted_remove_edge
+	G.iterate_scoreranks = counted_iterate_scoreranks
+	G.solve = recorded_solve
+	if hasattr(G, 'transition_matrix'):
+		transition_matrix = G.transition_matrix
+
+		def counted_transition_matrix():
+			if G.matrix is None:
+				stats.count('matrix builds')
+			return transition_matrix()
+		G.transition_matrix = counted_transition_matrix
+	return G
+
+
+def profile(function, *args, **kwargs):
+	"""
+	Run function under cProfile, returns (result, profile)
+	"""
+	profiler = cProfile.Profile()
+	result = profiler.runcall(function, *args, **kwargs)
+	return result, profiler
+
+
+def print_profile(profiler, path=None, sort='cumulative', limit=25, stream=sys.stdout):
+	"""
+	Print the top functions of a profile (and save it for pstats/snakeviz if path given)
+	"""
+	if path:
+		profiler.dump_stats(path)
+	pstats.Stats(profiler, stream=stream).sort_stats(sort).print_stats(limit)
@@ -0,0 +1,256 @@
+# Local ScoreRank prediction service over HTTP
+# e.g. python SR_Server.py --snapshot graph_snapshot    or    python SR_Server.py 2013.csv 2014.csv
+#
+# GET  /predict?home=Arsenal&away=Chelsea   -> ScoreRank difference for one fixture
+# POST /predict  [["Arsenal", "Chelsea"], ...]   -> differences for a list of fixtures
+# POST /results  [["Arsenal", "Chelsea", 2, 1], ...]   -> queue new results, ranks updated in the background
+# GET  /ranks?top=20   -> current ranking
+
+import json
+import logging
+import urlparse
+import threading
+import Queue
+import argparse
+import BaseHTTPServer
+import SocketServer
+import numpy as np
+import SR_Graph
+import SR_Data
+import SR_Snapshot
+import SR_Stream
+
+
+# Errors in the background updater go to this logger (it keeps running)
+logger = logging.getLogger('SR_Server')
+
+
+class RankService:
+	"""
+	Answers ScoreRank predictions from in-memory arrays, updated by a background thread
+
+	Readers use whichever (teams, home team index, away team index, scoreranks)
+	is currently published, without locking. The indexes are the same unless
+	the graph is a HomeAwayGraph, where fixtures are predicted from the home
+	team's home node and the away team's away node. New results are queued and applied to a separate live
+	graph; the new ranks are then published by swapping in a new tuple
+	"""
+
+	def __init__(self, graph, tol=1e-6, max_iter=20):
+		self.ranker = SR_Stream.LiveRanker(tol=tol, max_iter=max_iter, graph=graph)
+		self.results = Queue.Queue()
+		self.updates = 0
+		self.publish()
+		self.updater = threading.Thread(target=self.apply_results)
+		self.updater.daemon = True
+		self.updater.start()
+
+	def publish(self):
+		"""
+		Make the live graph's current scoreranks visible to readers
+		"""
+		G = self.ranker.graph
+		teams = list(G)
+		team_index = dict((team, i) for i, team in enumerate(teams))
+		if isinstance(G, SR_Graph.HomeAwayGraph):
+			home_index = dict((team, i) for (team, side), i in team_index.items() if side == 'home')
+			away_index = dict((team, i) for (team, side), i in team_index.items() if side == 'away')
+		else:
+			home_index = away_index = team_index
+		self.published = (teams, home_index, away_index, np.array([G.get_scorerank(team) for team in teams]))
+
+	def apply_results(self):
+		"""
+		Background loop: apply queued results (all waiting at once) and publish new ranks
+		"""
+		while True:
+			batch = [self.results.get()]
+			while not self.results.empty():
+				batch.append(self.results.get())
+			try:
+				self.ranker.update(batch)
+				self.publish()
+				self.updates += 1
+			except Exception:
+				logger.exception("Failed to apply %s results, ranks not updated", len(batch))
+
+	def add_results(self, results):
+		"""
+		Queue (home_team, away_team, home_score, away_score) results for the background update
+
+		The whole batch is checked first (see parse_results), so a bad result
+		raises ValueError with nothing queued
+		"""
+		for result in parse_results(results):
+			self.results.put(result)
+
+	def predict(self, home_team, away_team):
+		"""
+		Return ScoreRank difference (home minus away) for one fixture
+		"""
+		_, home_index, away_index, scoreranks = self.published
+		return scoreranks[home_index[home_team]] - scoreranks[away_index[away_team]]
+
+	def predict_many(self, fixtures):
+		"""
+		Return array of ScoreRank differences for a list of (home_team, away_team), NaN for unknown teams
+		"""
+		_, home_index, away_index, scoreranks = self.published
+		differences, _ = SR_Graph.fixture_differences(home_index, scoreranks,
+			[home_team for home_team, _ in fixtures], [away_team for _, away_team in fixtures], away_index)
+		return differences
+
+	def get_scoreranks(self, top=None):
+		"""
+		Return [(team, scorerank)] highest first (top teams only if given)
+		"""
+		teams, _, _, scoreranks = self.published
+		return [(teams[i], scoreranks[i]) for i in SR_Graph.top_indices(scoreranks, len(teams) if top is None else top).tolist()]
+
+
+class RequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+	"""
+	JSON over HTTP front end for a RankService (set as the server's service attribute)
+	"""
+
+	protocol_version = 'HTTP/1.1'  # keep connections alive between requests
+	wbufsize = -1  # write each response in one go (flushed after every request)
+	disable_nagle_algorithm = True
+
+	def do_GET(self):
+		url = urlparse.urlparse(self.path)
+		query = dict(urlparse.parse_qsl(url.query))
+		service = self.server.service
+		if url.path == '/predict':
+			missing = [name for name in ['home', 'away'] if name not in query]
+			if missing:
+				return self.send_json({'error': 'Missing parameter: {}'.format(', '.join(missing))}, 400)
+			try:
+				difference = service.predict(query['home'], query['away'])
+			except KeyError as e:
+				return self.send_json({'error': 'Unknown team: {}'.format(e)}, 404)
+			self.send_json({'home': query['home'], 'away': query['away'], 'scorerank_difference': difference})
+		elif url.path == '/ranks':
+			try:
+				top = parse_count(query['top'], 'top') if 'top' in query else None
+			except ValueError as e:
+				return self.send_json({'error': str(e)}, 400)
+			self.send_json({'scoreranks': service.get_scoreranks(top), 'updates': service.updates})
+		else:
+			self.send_json({'error': 'Not found'}, 404)
+
+	def do_POST(self):
+		service = self.server.service
+		try:
+			body = json.loads(self.rfile.read(int(self.headers.getheader('content-length', 0))))
+		except ValueError:
+			return self.send_json({'error': 'Body must be JSON'}, 400)
+		try:
+			if self.path == '/predict':
+				differences = service.predict_many(parse_fixtures(body))
+				self.send_json({'scorerank_differences': [None if np.isnan(x) else x for x in differences.tolist()]})
+			elif self.path == '/results':
+				service.add_results(body)
+				self.send_json({'queued': len(body)}, 202)
+			else:
+				self.send_json({'error': 'Not found'}, 404)
+		except ValueError as e:
+			self.send_json({'error': str(e)}, 400)
+
+	def send_json(self, data, status=200):
+		body = json.dumps(data)
+		self.send_response(status)
+		self.send_header('Content-Type', 'application/json')
+		self.send_header('Content-Length', str(len(body)))
+		self.end_headers()
+		self.wfile.write(body)
+
+	def log_message(self, format, *args):
+		pass  # don't print a line per request
+
+
+def parse_count(value, name):
+	"""
+	Returns value (e.g. a query parameter) as an integer >= 0, raises ValueError naming the parameter if it is not one
+	"""
+	message = "{} must be a whole number >= 0, got {}".format(name, json.dumps(value))
+	if isinstance(value, bool) or not isinstance(value, (int, long, basestring)):
+		raise ValueError(message)
+	try:
+		count = int(value)
+	except ValueError:
+		raise ValueError(message)
+	if count < 0:
+		raise ValueError(message)
+	return count
+
+
+def parse_rows(body, columns):
+	"""
+	Check body is a list of lists with one entry per column, team columns being strings; raises ValueError otherwise
+	"""
+	if not isinstance(body, list):
+		raise ValueError("Body must be a list of [{}]".format(", ".join(columns)))
+	for i, row in enumerate(body):
+		if not isinstance(row, list) or len(row) != len(columns):
+			raise ValueError("Row {} must be [{}], got {}".format(i, ", ".join(columns), json.dumps(row)))
+		for column, value in zip(columns, row):
+			if column.endswith('_team') and not isinstance(value, basestring):
+				raise ValueError("Row {}: {} must be a string, got {}".format(i, column, json.dumps(value)))
+	return body
+
+
+def parse_fixtures(body):
+	"""
+	Returns [(home_team, away_team)] from a JSON body of pairs, raises ValueError if it is not one
+	"""
+	return [tuple(row) for row in parse_rows(body, ['home_team', 'away_team'])]
+
+
+def parse_results(body):
+	"""
+	Returns [(home_team, away_team, home_score, away_score)] from a JSON body of results, raises ValueError if it is not one
+
+	Scores must be whole numbers >= 0 (or strings of them)
+	"""
+	results = []
+	for i, (home_team, away_team, home_score, away_score) in enumerate(parse_rows(body, ['home_team', 'away_team', 'home_score', 'away_score'])):
+		results.append((home_team, away_team, parse_count(home_score, "Row {}: home_score".format(i)),
+			parse_count(away_score, "Row {}: away_score".format(i))))
+	return results
+
+
+class ThreadedHTTPServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+	daemon_threads = True
+
+
+def create_server(service, host='127.0.0.1', port=8000):
+	"""
+	Create (not yet started) HTTP server answering from a RankService
+	"""
+	server = ThreadedHTTPServer((host, port), RequestHandler)
+	server.service = service
+	return server
+
+
+if __name__ == '__main__':
+
+	parser = argparse.ArgumentParser(description='Serve ScoreRank predictions over HTTP')
+	parser.add_argument('csv_files', nargs='*', help='season CSVs to build the graph from')
+	parser.add_argument('--snapshot', help='graph snapshot directory (see SR_Snapshot) to load instead')
+	parser.add_argument('--host', default='127.0.0.1')
+	parser.add_argument('--port', type=int, default=8000)
+	args = parser.parse_args()
+
+	# Load a solved graph once
+	if args.snapshot:
+		G = SR_Snapshot.load_graph(args.snapshot)
+	else:
+		df = SR_Data.load_matches(args.csv_files or ['2014.csv'])
+		G = SR_Graph.CompactGraph.from_matches(df['HomeTeam'], df['AwayTeam'], df['FTHG'], df['FTAG'], leak=0.2)
+		G.redistribute_scoreranks()
+		G.solve()
+
+	server = create_server(RankService(G), args.host, args.port)
+	print "Serving ScoreRank for {} teams on http://{}:{}/".format(G.size, args.host, args.port)
+	server.serve_forever()
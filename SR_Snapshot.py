@@ -0,0 +1,242 @@
+import os
+import json
+import numpy as np
+import SR_Graph
+
+
+# Snapshots are directories of .npy arrays (loaded memory-mapped) plus a small JSON file of metadata
+SNAPSHOT_VERSION = 1
+
+
+def graph_arrays(G):
+	"""
+	Returns (teams, team_from, team_to, weights, scoreranks) arrays for a graph of any engine
+
+	teams is a 1-D object array of the graph's keys (e.g. (team, side) nodes of a HomeAwayGraph)
+	"""
+	teams = list(G)
+	if isinstance(G, SR_Graph.CompactGraph):
+		G.compact_edges()
+		team_from, team_to, weights = list(G.edge_from), list(G.edge_to), list(G.edge_weight)
+	else:
+		team_index = dict((team, i) for i, team in enumerate(teams))
+		team_from, team_to, weights = [], [], []
+		for team in teams:
+			node = G.nodes[team]
+			for nbr in node.outgoing:
+				team_from.append(team_index[team])
+				team_to.append(team_index[nbr.team])
+				weights.append(node.outgoing[nbr])
+	scoreranks = [G.get_scorerank(team) for team in teams]
+	keys = np.empty(len(teams), dtype=object)
+	keys[:] = teams
+	return (keys, np.array(team_from, dtype=np.int32), np.array(team_to, dtype=np.int32),
+		np.array(weights, dtype=float), np.array(scoreranks, dtype=float))
+
+
+def key_arrays(teams):
+	"""
+	Returns {name: array} storing graph keys as plain (memory-mappable) arrays: teams, plus sides for (team, side) nodes
+	"""
+	teams = list(teams)
+	if teams and isinstance(teams[0], tuple):
+		return {'teams': np.array([team for team, _ in teams]), 'sides': np.array([side for _, side in teams])}
+	return {'teams': np.array(teams)}
+
+
+def snapshot_keys(arrays):
+	"""
+	Returns list of graph keys stored by key_arrays
+	"""
+	teams = arrays['teams'].tolist()
+	if 'sides' in arrays:
+		return zip(teams, arrays['sides'].tolist())
+	return teams
+
+
+def save_graph(G, path):
+	"""
+	Save a (solved) graph as a snapshot directory: team index, edge arrays, scoreranks and metadata
+	"""
+	teams, team_from, team_to, weights, scoreranks = graph_arrays(G)
+	arrays = {'edge_from': team_from, 'edge_to': team_to, 'edge_weight': weights, 'scoreranks': scoreranks}
+	arrays.update(key_arrays(teams))
+	metadata = {
+		'version': SNAPSHOT_VERSION,
+		'kind': 'graph',
+		'engine': G.__class__.__name__,
+		'leak': G.leak,
+		'iterations': G.iterations,
+		'residual': G.residual,
+	}
+	if isinstance(G, SR_Graph.HomeAwayGraph):
+		metadata['coupling'] = G.coupling
+	write_snapshot(path, arrays, metadata)
+
+
+def open_graph(path):
+	"""
+	Open a graph snapshot read-only, with its arrays memory-mapped rather than read into RAM
+	"""
+	arrays, metadata = read_snapshot(path, 'graph')
+	return GraphSnapshot(arrays, metadata)
+
+
+def load_graph(path, graph_class=None):
+	"""
+	Load a graph snapshot into a new graph that can be updated and re-solved
+
+	graph_class defaults to CompactGraph, or HomeAwayGraph for a snapshot of one
+	"""
+	arrays, metadata = read_snapshot(path, 'graph')
+	teams = snapshot_keys(arrays)
+	if metadata['engine'] == 'HomeAwayGraph' and graph_class in [None, SR_Graph.HomeAwayGraph]:
+		G = SR_Graph.HomeAwayGraph(leak=metadata['leak'], coupling=metadata['coupling'])
+	else:
+		G = (graph_class or SR_Graph.CompactGraph)(leak=metadata['leak'])
+	G.add_nodes(teams)
+	for i, j, weight in zip(arrays['edge_from'].tolist(), arrays['edge_to'].tolist(), arrays['edge_weight'].tolist()):
+		G.add_edge(teams[i], teams[j], int(weight) if weight == int(weight) else weight)
+	G.seed_scoreranks(dict(zip(teams, arrays['scoreranks'].tolist())))
+	G.iterations = metadata['iterations']
+	G.residual = metadata['residual']
+	return G
+
+
+def save_rank_history(path, rank_history, team_names=None):
+	"""
+	Save per-date scoreranks from a rolling backtest as a (dates x teams) array
+
+	rank_history is a list of (date, teams, scoreranks) as recorded by
+	bookies_correlation.backtest. team_names optionally maps the teams used as
+	graph keys (e.g. integer codes) to names. Teams not ranked on a date are NaN
+	"""
+	all_teams = sorted(set(team for _, teams, _ in rank_history for team in teams))
+	team_index = dict((team, i) for i, team in enumerate(all_teams))
+	scoreranks = np.empty((len(rank_history), len(all_teams)))
+	scoreranks.fill(np.nan)
+	for row, (_, teams, ranks) in enumerate(rank_history):
+		scoreranks[row, [team_index[team] for team in teams]] = ranks
+	if team_names is not None:
+		all_teams = [team_names[team] for team in all_teams]
+	arrays = {
+		'dates': np.array([date for date, _, _ in rank_history], dtype='datetime64[ns]'),
+		'teams': np.array(all_teams),
+		'scoreranks': scoreranks,
+	}
+	write_snapshot(path, arrays, {'version': SNAPSHOT_VERSION, 'kind': 'rank_history'})
+
+
+def open_rank_history(path):
+	"""
+	Open a rank history snapshot read-only, with its arrays memory-mapped rather than read into RAM
+	"""
+	arrays, metadata = read_snapshot(path, 'rank_history')
+	return RankHistory(arrays, metadata)
+
+
+def write_snapshot(path, arrays, metadata):
+	"""
+	Write each array as .npy (so it can be memory-mapped) plus metadata.json
+	"""
+	if not os.path.exists(path):
+		os.makedirs(path)
+	for filename in os.listdir(path):
+		if filename.endswith('.npy') and filename[:-len('.npy')] not in arrays:
+			os.remove(os.path.join(path, filename))  # left from an earlier snapshot, would be read back with these
+	for name, values in arrays.items():
+		np.save(os.path.join(path, name + '.npy'), values)
+	with open(os.path.join(path, 'metadata.json'), 'w') as f:
+		json.dump(metadata, f, indent=1)
+
+
+def read_snapshot(path, kind):
+	"""
+	Returns ({name: memory-mapped array}, metadata) for a snapshot directory
+	"""
+	with open(os.path.join(path, 'metadata.json')) as f:
+		metadata = json.load(f)
+	if metadata.get('kind') != kind:
+		raise ValueError("{} is a '{}' snapshot, not '{}'".format(path, metadata.get('kind'), kind))
+	arrays = {}
+	for filename in os.listdir(path):
+		if filename.endswith('.npy'):
+			arrays[filename[:-len('.npy')]] = np.load(os.path.join(path, filename), mmap_mode='r')
+	return arrays, metadata
+
+
+class GraphSnapshot:
+	"""
+	Read-only solved graph backed by memory-mapped snapshot arrays
+	"""
+
+	def __init__(self, arrays, metadata):
+		self.teams = snapshot_keys(arrays)
+		self.team_index = dict((team, i) for i, team in enumerate(self.teams))
+		self.scoreranks = arrays['scoreranks']
+		self.edge_from = arrays['edge_from']
+		self.edge_to = arrays['edge_to']
+		self.edge_weight = arrays['edge_weight']
+		self.size = len(self.teams)
+		self.leak = metadata['leak']
+		self.iterations = metadata['iterations']
+		self.residual = metadata['residual']
+
+	def get_scorerank(self, team_name):
+		"""
+		Return scorerank of team
+		"""
+		return self.scoreranks[self.team_index[team_name]]
+
+	def get_scoreranks(self):
+		scoreranks = zip(self.teams, self.scoreranks.tolist())
+		scoreranks.sort(key=lambda x: x[1], reverse=True)
+		return scoreranks
+
+	def __repr__(self):
+		return "Graph snapshot with {} nodes".format(self.size)
+
+	def __iter__(self):
+		return iter(self.teams)
+
+
+class RankHistory:
+	"""
+	Read-only per-date scoreranks backed by memory-mapped snapshot arrays
+	"""
+
+	def __init__(self, arrays, metadata):
+		self.dates = arrays['dates']
+		self.teams = arrays['teams'].tolist()
+		self.team_index = dict((team, i) for i, team in enumerate(self.teams))
+		self.scoreranks = arrays['scoreranks']
+
+	def date_row(self, date):
+		"""
+		Returns row of the latest ranking on or before date
+		"""
+		row = np.searchsorted(self.dates, np.datetime64(date, 'ns'), side='right') - 1
+		if row < 0:
+			raise KeyError("No ranking on or before {}".format(date))
+		return row
+
+	def get_scorerank(self, date, team_name):
+		"""
+		Return scorerank of team as ranked on (or most recently before) date
+		"""
+		return self.scoreranks[self.date_row(date), self.team_index[team_name]]
+
+	def get_scoreranks(self, date):
+		"""
+		Return [(team, scorerank)] as ranked on (or most recently before) date, highest first
+		"""
+		ranks = self.scoreranks[self.date_row(date)]
+		scoreranks = [(team, rank) for team, rank in zip(self.teams, ranks.tolist()) if not np.isnan(rank)]
+		scoreranks.sort(key=lambda x: x[1], reverse=True)
+		return scoreranks
+
+	def __len__(self):
+		return len(self.dates)
+
+	def __repr__(self):
+		return "Rank history of {} teams over {} dates".format(len(self.teams), len(self.dates))
@@ -0,0 +1,127 @@
+# Streaming ScoreRank: apply match results one by one (or in batches) to a live graph
+# e.g. tail -n +1 -f results.csv | python SR_Stream.py    or    python SR_Stream.py 2014.csv
+
+import sys
+import csv
+import time
+import SR_Graph
+import SR_Window
+
+
+def csv_records(lines, header=None):
+	"""
+	Generator of (home_team, away_team, home_score, away_score) from CSV lines
+
+	Column names are taken from the first line unless header (a list) is given.
+	Rows without a full-time score (e.g. fixtures not yet played) are skipped
+	"""
+	rows = csv.reader(lines)
+	if header is None:
+		header = next(rows)
+	home, away, home_goals, away_goals = [header.index(column) for column in ['HomeTeam', 'AwayTeam', 'FTHG', 'FTAG']]
+	for row in rows:
+		if len(row) <= max(home, away, home_goals, away_goals) or row[home_goals] == '' or row[away_goals] == '':
+			continue
+		yield row[home], row[away], int(row[home_goals]), int(row[away_goals])
+
+
+def follow(filename, poll_interval=1.0):
+	"""
+	Generator of lines from a file, waiting for new lines as they are appended (like tail -f)
+	"""
+	with open(filename) as f:
+		while True:
+			line = f.readline()
+			if line:
+				yield line
+			else:
+				time.sleep(poll_interval)
+
+
+def queue_records(queue, sentinel=None):
+	"""
+	Generator of records taken from a Queue.Queue (e.g. filled by another thread), until sentinel is taken
+	"""
+	while True:
+		record = queue.get()
+		if record is sentinel:
+			return
+		yield record
+
+
+def batched(records, batch_size):
+	"""
+	Generator of lists of up to batch_size records
+	"""
+	batch = []
+	for record in records:
+		batch.append(record)
+		if len(batch) == batch_size:
+			yield batch
+			batch = []
+	if batch:
+		yield batch
+
+
+class LiveRanker:
+	"""
+	ScoreRank graph updated in place as results arrive
+
+	Each update adds the new matches' edges (expiring the oldest if a window
+	size is given), then re-converges warm-started from the current ranks. The
+	iterations per update are capped at max_iter, so each update costs at most
+	max_iter mat-vecs over the current graph, however long the history
+	"""
+
+	def __init__(self, leak=0.2, tol=1e-6, max_iter=20, window_size=None, graph=None, graph_class=SR_Graph.CompactGraph):
+		self.tol = tol
+		self.max_iter = max_iter
+		self.window = SR_Window.RollingWindow(size=window_size or float('inf'), leak=leak, graph_class=graph_class, graph=graph)
+		self.graph = self.window.graph
+		self.matches_applied = 0
+
+	def update(self, matches, top=None):
+		"""
+		Apply a batch of (home_team, away_team, home_score, away_score) results and re-rank
+
+		Returns [(team, scorerank)] highest first, for the top teams only if given
+		"""
+		self.window.add_matches(matches)
+		self.window.solve(iterations=self.max_iter, tol=self.tol)
+		self.matches_applied += len(matches)
+		if top is None:
+			return self.graph.get_scoreranks()
+		return self.graph.top_scoreranks(top)
+
+	def stream(self, records, batch_size=1, top=None):
+		"""
+		Generator of (batch, scoreranks, seconds taken) for each batch of records applied
+		"""
+		for batch in batched(records, batch_size):
+			start = time.time()
+			scoreranks = self.update(batch, top)
+			yield batch, scoreranks, time.time() - start
+
+	def __repr__(self):
+		return "Live ranker after {} matches, {}".format(self.matches_applied, self.graph)
+
+
+if __name__ == '__main__':
+
+	# Settings
+	batch_size = 1
+	top_teams = 5
+
+	# Read results from a file given on the command line (followed for new lines), or stdin
+	if len(sys.argv) > 1:
+		lines = follow(sys.argv[1])
+	else:
+		lines = iter(sys.stdin.readline, '')
+
+	ranker = LiveRanker()
+	for batch, scoreranks, seconds in ranker.stream(csv_records(lines), batch_size, top_teams):
+		for home_team, away_team, home_score, away_score in batch:
+			print "{} {}-{} {}".format(home_team, home_score, away_score, away_team)
+		print "  Top {}: {}".format(top_teams, ", ".join("{} ({:.3f})".format(team, scorerank) for team, scorerank in scoreranks))
+		print "  Updated in {:.1f}ms ({} iterations)".format(seconds * 1000, ranker.graph.iterations)
+		sys.stdout.flush()
@@ -0,0 +1,101 @@
+# Hyperparameter sweep for the bookies correlation backtest
+# Evaluates R^2 between ScoreRank and Bet365 over a grid of leak, window size, matches required and iteration count
+
+import time
+import numpy as np
+import pandas as pd
+import SR_Graph
+import SR_Window
+import SR_Data
+import bookies_correlation
+reload(SR_Graph)
+reload(SR_Window)
+reload(SR_Data)
+
+
+def window_predictions(matches, historical_match_number, leaks, iterations):
+	"""
+	Scorerank differences for every predictable match using one window size
+
+	One rolling graph is shared by all leaks and iteration counts: each date's
+	graph is solved for all leaks at once (from all scoreranks 1, i.e. no warm
+	start). Returns (rows, appearances, differences) where appearances is the
+	fewer matches played by the two teams, and differences has shape
+	(matches, iterations+1, leaks)
+	"""
+	home, away, dates = matches['home'], matches['away'], matches['dates']
+	home_goals, away_goals = matches['home_goals'], matches['away_goals']
+
+	# Rolling graph of recent matches (includes row i itself, as in the backtest, hence the +1)
+	window = SR_Window.RollingWindow(size=historical_match_number+1, graph_class=SR_Graph.SparseGraph)
+	next_row = 0
+
+	rows, appearances, differences = [], [], []
+	previous_date = None
+	for i in range(historical_match_number, len(home)):
+		if dates[i] != previous_date:
+			window.add_matches(zip(home[next_row:i+1], away[next_row:i+1], home_goals[next_row:i+1], away_goals[next_row:i+1]))
+			next_row = i + 1
+			G = window.graph
+			history = G.solve_leaks(leaks, iterations)
+		previous_date = dates[i]
+
+		# Teams only playing later on this date are not in the graph yet (never eligible)
+		if home[i] not in G.team_index or away[i] not in G.team_index:
+			continue
+		rows.append(i)
+		appearances.append(min(window.appearances[home[i]], window.appearances[away[i]]))
+		differences.append(history[:, G.team_index[home[i]], :] - history[:, G.team_index[away[i]], :])
+
+	return np.array(rows, dtype=int), np.array(appearances), np.array(differences)
+
+
+def sweep(matches, leaks=[0.2], windows=[380], matches_required=[3], iterations=[5]):
+	"""
+	Returns dataframe of R^2 (ScoreRank vs. Bet365) for every combination of parameters
+
+	Each window size is backtested once, solving all leaks and iteration counts together
+	"""
+	odds = matches['odds'].astype(float)
+	bookie_predictions = bookies_correlation.bookie_calculator(odds[:, 0], odds[:, 1], odds[:, 2])
+
+	results = []
+	for historical_match_number in windows:
+		rows, appearances, differences = window_predictions(matches, historical_match_number, leaks, max(iterations))
+		for required in matches_required:
+			eligible = appearances >= required
+			bookie = bookie_predictions[rows[eligible]]
+			for iteration_number in iterations:
+				for l, leak in enumerate(leaks):
+					scorerank_differences = differences[eligible, iteration_number, l]
+					correlation = np.corrcoef(scorerank_differences, bookie)[0, 1]
+					results.append({
+						'leak': leak,
+						'historical_match_number': historical_match_number,
+						'matches_required': required,
+						'iterations': iteration_number,
+						'predictions': eligible.sum(),
+						'r_squared': correlation**2,
+					})
+	return pd.DataFrame(results, columns=['leak', 'historical_match_number', 'matches_required', 'iterations', 'predictions', 'r_squared'])
+
+
+if __name__ == '__main__':
+
+	# Parameter grid
+	leaks = [0.05, 0.1, 0.15, 0.2, 0.25, 0.3, 0.4, 0.5]
+	windows = [190, 380, 760]
+	matches_required = [1, 3, 5]
+	iterations = [3, 5, 10, 20]
+
+	# Load CSV files into match arrays
+	years = range(2007, 2015)
+	csv_list = ['{}.csv'.format(year) for year in years]
+	df = SR_Data.load_matches(csv_list, columns=['Date', 'HomeTeam', 'AwayTeam', 'FTHG', 'FTAG', 'B365H', 'B365D', 'B365A'])
+	df = SR_Data.sort_by_date(df)  # 2013.csv repeats the start of 2014.csv
+	matches = bookies_correlation.match_arrays(df)
+
+	start = time.time()
+	results = sweep(matches, leaks, windows, matches_required, iterations)
+	print "Swept {} parameter combinations in {:.1f}s".format(len(results), time.time() - start)
+	print results.sort_values('r_squared', ascending=False).head(20).to_string(index=False)
@@ -0,0 +1,86 @@
+import numpy as np
+import pandas as pd
+
+
+# Columns of a league table: played, won, drawn, lost, goals for/against, goal difference, points
+TABLE_COLUMNS = ['P', 'W', 'D', 'L', 'GF', 'GA', 'GD', 'Pts']
+
+
+def team_codes(df):
+	"""
+	Returns (teams, home codes, away codes) with home and away teams numbered together
+	"""
+	home, away = df['HomeTeam'], df['AwayTeam']
+	if hasattr(home, 'cat') and hasattr(away, 'cat') and home.cat.categories.equals(away.cat.categories):
+		return home.cat.categories.tolist(), home.cat.codes.values, away.cat.codes.values  # as loaded by SR_Data
+	codes, teams = pd.factorize(np.concatenate([home.values.astype(object), away.values.astype(object)]), sort=True)
+	return teams.tolist(), codes[:len(df)], codes[len(df):]
+
+
+def match_results(df):
+	"""
+	Returns (teams, codes, stats): one row of table stats per team per match (home rows, then away rows)
+
+	Results come from the FTR column (H/D/A) if present, otherwise from the goals
+	"""
+	teams, home, away = team_codes(df)
+	home_goals, away_goals = df['FTHG'].values.astype(int), df['FTAG'].values.astype(int)
+	if 'FTR' in df:
+		result = df['FTR'].astype(str).values
+		home_win, draw, away_win = result == 'H', result == 'D', result == 'A'
+	else:
+		home_win, draw, away_win = home_goals > away_goals, home_goals == away_goals, home_goals < away_goals
+	won = np.concatenate([home_win, away_win])
+	drawn = np.concatenate([draw, draw])
+	goals_for = np.concatenate([home_goals, away_goals])
+	goals_against = np.concatenate([away_goals, home_goals])
+	stats = np.column_stack([np.ones(len(won), dtype=int), won, drawn, ~(won | drawn), goals_for, goals_against,
+		goals_for - goals_against, 3 * won + drawn]).astype(int)
+	return teams, np.concatenate([home, away]), stats
+
+
+def league_table(df):
+	"""
+	Returns league table (rows = teams, columns = TABLE_COLUMNS) for all matches in df, top team first
+	"""
+	teams, codes, stats = match_results(df)
+	totals = np.column_stack([np.bincount(codes, weights=stats[:, k], minlength=len(teams)) for k in range(stats.shape[1])])
+	table = pd.DataFrame(totals.astype(int), index=pd.Index(teams, name='Team'), columns=TABLE_COLUMNS)
+	return table.iloc[np.argsort(-table_order(totals), kind='mergesort')]
+
+
+def table_history(df):
+	"""
+	Returns the league table as it stood after every matchday at once
+
+	Dataframe indexed by (Date, Team), with every team on every date (P=0
+	before its first match), so history.loc[date] is the table on that date
+	"""
+	teams, codes, stats = match_results(df)
+	dates, date_rows = np.unique(df['Date'].values, return_inverse=True)
+	cell = np.concatenate([date_rows, date_rows]) * len(teams) + codes
+	per_date = np.column_stack([np.bincount(cell, weights=stats[:, k], minlength=len(dates) * len(teams)) for k in range(stats.shape[1])])
+	cumulative = per_date.reshape(len(dates), len(teams), -1).cumsum(axis=0)
+	index = pd.MultiIndex.from_product([dates, teams], names=['Date', 'Team'])
+	return pd.DataFrame(cumulative.reshape(-1, len(TABLE_COLUMNS)).astype(int), index=index, columns=TABLE_COLUMNS)
+
+
+def table_positions(history):
+	"""
+	Returns league position (1 = top) of every team after every matchday (rows = dates, columns = teams)
+	"""
+	dates, teams = history.index.levels
+	totals = history.values.reshape(len(dates), len(teams), -1)
+	order = np.argsort(-table_order(totals), axis=1, kind='mergesort')
+	positions = np.empty_like(order)
+	np.put_along_axis(positions, order, np.arange(1, len(teams) + 1), axis=1)
+	return pd.DataFrame(positions, index=dates, columns=teams)
+
+
+def table_order(totals):
+	"""
+	Returns sort key for table rows: points, then goal difference, then goals scored (last axis = TABLE_COLUMNS)
+	"""
+	totals = np.asarray(totals, dtype=float)
+	points, goal_difference, goals_for = [totals[..., TABLE_COLUMNS.index(column)] for column in ['Pts', 'GD', 'GF']]
+	return (points * 1e4 + goal_difference + 1e3) * 1e4 + goals_for
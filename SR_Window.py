@@ -0,0 +1,187 @@
+import collections
+import numpy as np
+import SR_Graph
+
+
+class RollingWindow:
+	"""
+	ScoreRank graph over the most recent matches only
+
+	Matches are added as they are played and the oldest ones expired once the
+	window is full, so the graph is updated rather than rebuilt for every date
+	"""
+
+	def __init__(self, size=380, leak=0.2, graph_class=SR_Graph.Graph, graph=None):
+		self.size = size
+		self.graph = graph_class(leak=leak) if graph is None else graph  # edges already in graph never expire
+		self.matches = collections.deque()
+		self.appearances = {}
+
+	def add_match(self, home_team, away_team, home_score, away_score, date=None):
+		"""
+		Add a match to the window (goals scored become edges, see Graph.add_match)
+
+		date is not used, it is accepted so the same matches can be given to a DecayingWindow
+		"""
+		self.graph.add_match(home_team, away_team, int(home_score), int(away_score))
+		self.matches.append((home_team, away_team, int(home_score), int(away_score)))
+		for team in [home_team, away_team]:
+			self.appearances[team] = self.appearances.get(team, 0) + 1
+
+	def expire_match(self):
+		"""
+		Remove the oldest match from the window, and any team no longer appearing in it
+		"""
+		home_team, away_team, home_score, away_score = self.matches.popleft()
+		self.graph.remove_match(home_team, away_team, home_score, away_score)
+		for team in [home_team, away_team]:
+			self.appearances[team] -= 1
+			if self.appearances[team] == 0:
+				del self.appearances[team]
+				self.graph.remove_node(team)
+
+	def add_matches(self, matches):
+		"""
+		Add (home_team, away_team, home_score, away_score[, date]) matches, expiring the oldest beyond window size
+		"""
+		for match in matches:
+			self.add_match(*match)
+		while len(self.matches) > self.size:
+			self.expire_match()
+
+	def solve(self, iterations=5, tol=None, warm_start=True):
+		"""
+		Re-rank the graph warm-started from the previous ranks (new teams start at 1)
+
+		Runs a fixed number of iterations, or if tol is given iterates until converged
+		(with iterations as the maximum). With warm_start=False all ranks restart at 1
+		"""
+		if warm_start:
+			self.graph.fill_scoreranks()
+		else:
+			self.graph.redistribute_scoreranks()
+		if tol is None:
+			self.graph.iterate_scoreranks_n(iterations)
+		else:
+			self.graph.solve(tol=tol, max_iter=iterations)
+		return self.graph
+
+	def __len__(self):
+		return len(self.matches)
+
+	def __repr__(self):
+		return "Rolling window of {} matches (max {}), {}".format(len(self.matches), self.size, self.graph)
+
+
+
+class DecayingWindow:
+	"""
+	ScoreRank graph over all matches so far, older goals counting exponentially less
+
+	A goal scored half_life days before the latest match counts half as much.
+	Rather than decaying every edge as time passes, new goals are added with a
+	weight growing as 2**(days / half_life): each team's scorerank is shared in
+	proportion to its edge weights, so scaling every edge by the same amount
+	changes nothing and moving forward in time costs nothing. Stored weights are
+	only rescaled (rebased) once they grow by rebase_factor, and teams whose
+	decayed goals (scored and conceded) fall below min_weight are dropped
+	"""
+
+	def __init__(self, half_life=365.0, leak=0.2, graph_class=SR_Graph.Graph, graph=None, min_weight=1.0, rebase_factor=2.0**20):
+		self.half_life = float(half_life)
+		self.graph = graph_class(leak=leak) if graph is None else graph  # edges already in graph count as undecayed
+		self.min_weight = min_weight
+		self.rebase_factor = rebase_factor
+		self.origin = None  # day stored weights are relative to
+		self.latest = None  # day of the latest match
+		self.weights = {}  # stored goals in each team's matches
+		self.appearances = {}
+		self.match_count = 0
+
+	def scale(self, day):
+		"""
+		Returns stored weight of one goal scored on day
+		"""
+		return 2.0 ** ((day - self.origin) / self.half_life)
+
+	def add_match(self, home_team, away_team, home_score, away_score, date):
+		"""
+		Add a match played on date (datetime or days), goals weighted by how recent the date is
+		"""
+		day = match_day(date)
+		if self.origin is None:
+			self.origin = day
+		self.latest = day if self.latest is None else max(self.latest, day)
+		if self.scale(day) > self.rebase_factor:
+			self.rebase(day)
+		scale = self.scale(day)
+		self.graph.add_match(home_team, away_team, int(home_score) * scale, int(away_score) * scale)
+		for team in [home_team, away_team]:
+			self.weights[team] = self.weights.get(team, 0) + (int(home_score) + int(away_score)) * scale
+			self.appearances[team] = self.appearances.get(team, 0) + 1
+		self.match_count += 1
+
+	def add_matches(self, matches):
+		"""
+		Add (home_team, away_team, home_score, away_score, date) matches
+		"""
+		for match in matches:
+			self.add_match(*match)
+
+	def rebase(self, day):
+		"""
+		Rescale stored weights so a goal on day has weight 1
+		"""
+		factor = 1.0 / self.scale(day)
+		self.graph.scale_edges(factor)
+		for team in self.weights:
+			self.weights[team] *= factor
+		self.origin = day
+
+	def decayed_weights(self):
+		"""
+		Returns {team: goals in its matches, decayed to the latest match}
+		"""
+		scale = self.scale(self.latest)
+		return dict((team, weight / scale) for team, weight in self.weights.items())
+
+	def prune(self):
+		"""
+		Remove teams whose decayed goals have fallen below min_weight
+		"""
+		threshold = self.min_weight * self.scale(self.latest)
+		for team in [team for team, weight in self.weights.items() if weight < threshold]:
+			del self.weights[team]
+			del self.appearances[team]
+			self.graph.remove_node(team)
+
+	def solve(self, iterations=5, tol=None, warm_start=True):
+		"""
+		Re-rank the graph as RollingWindow.solve, after dropping teams with too little recent weight
+		"""
+		if self.latest is not None:
+			self.prune()
+		if warm_start:
+			self.graph.fill_scoreranks()
+		else:
+			self.graph.redistribute_scoreranks()
+		if tol is None:
+			self.graph.iterate_scoreranks_n(iterations)
+		else:
+			self.graph.solve(tol=tol, max_iter=iterations)
+		return self.graph
+
+	def __len__(self):
+		return self.match_count
+
+	def __repr__(self):
+		return "Decaying window of {} matches (half life {} days), {}".format(self.match_count, self.half_life, self.graph)
+
+
+def match_day(date):
+	"""
+	Returns date (datetime, datetime64 or already a number of days) as days since 1970
+	"""
+	if isinstance(date, (int, long, float)):
+		return float(date)
+	return (np.datetime64(date, 'ns') - np.datetime64('1970-01-01', 'ns')) / np.timedelta64(1, 'D')
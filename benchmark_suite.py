@@ -0,0 +1,249 @@
+# Benchmark suite for ScoreRank: CSV loading, graph construction, iteration, partitioned solves and the bookies backtest
+# Runs on the bundled 2007-2014 CSVs and on synthetic leagues, writes results as JSON
+# e.g. python benchmark_suite.py --sizes 1000,10000,100000 --output benchmarks.json
+
+import sys
+import json
+import time
+import resource
+import argparse
+import multiprocessing
+import numpy as np
+import pandas as pd
+import SR_Graph
+import SR_Data
+import SR_League
+import bookies_correlation
+reload(SR_Graph)
+reload(SR_Data)
+reload(SR_League)
+reload(bookies_correlation)
+
+
+ENGINES = {
+	'Graph': SR_Graph.Graph,
+	'SparseGraph': SR_Graph.SparseGraph,
+	'CompactGraph': SR_Graph.CompactGraph,
+}
+
+BUNDLED_CSVS = ['{}.csv'.format(year) for year in range(2007, 2015)]
+
+
+def synthetic_matches(teams, matches_per_team=40, league_size=20, cross_league=0.05, seed=0):
+	"""
+	Random matches between teams grouped into leagues (a few matches across leagues)
+
+	Goals are Poisson with the scoring team's strength against the other's,
+	so the ranks have some structure. Returns (home, away, home_goals, away_goals)
+	"""
+	random = np.random.RandomState(seed)
+	n = teams * matches_per_team // 2
+	strength = random.lognormal(0, 0.3, teams)
+	home = random.randint(0, teams, n)
+	# Mostly another team in the same league, sometimes any team
+	league_start = home - home % league_size
+	away = np.minimum(league_start + random.randint(0, league_size, n), teams - 1)
+	anywhere = random.rand(n) < cross_league
+	away[anywhere] = random.randint(0, teams, anywhere.sum())
+	away[away == home] = (away[away == home] + 1) % teams
+	home_goals = random.poisson(1.5 * strength[home] / strength[away]).astype(np.int8)
+	away_goals = random.poisson(1.1 * strength[away] / strength[home]).astype(np.int8)
+	names = np.array(['Team {}'.format(i) for i in range(teams)], dtype=object)
+	return names[home], names[away], home_goals, away_goals
+
+
+def bundled_matches():
+	"""
+	(home, away, home_goals, away_goals) for all bundled season CSVs
+	"""
+	df = SR_Data.load_matches(BUNDLED_CSVS, columns=['HomeTeam', 'AwayTeam', 'FTHG', 'FTAG'])
+	return df['HomeTeam'].values.astype(object), df['AwayTeam'].values.astype(object), df['FTHG'].values, df['FTAG'].values
+
+
+def dataset_matches(dataset, matches_per_team=40):
+	"""
+	Matches for a dataset name: 'bundled' or 'synthetic-<teams>'
+	"""
+	if dataset == 'bundled':
+		return bundled_matches()
+	return synthetic_matches(int(dataset.split('-')[1]), matches_per_team)
+
+
+def bench_load_csv(mode):
+	"""
+	Time loading the bundled CSVs: all columns with pd.concat in a loop (as the scripts used to), SR_Data uncached, SR_Data cached
+	"""
+	start = time.time()
+	if mode == 'concat_all_columns':
+		df = pd.read_csv(BUNDLED_CSVS[0])
+		for filename in BUNDLED_CSVS[1:]:
+			df = pd.concat([df, pd.read_csv(filename)], ignore_index=True)
+	elif mode == 'load_matches':
+		df = SR_Data.load_matches(BUNDLED_CSVS, cache_dir=None)
+	else:
+		SR_Data.load_matches(BUNDLED_CSVS)  # make sure the cache exists
+		start = time.time()
+		df = SR_Data.load_matches(BUNDLED_CSVS)
+	return {'wall_time': time.time() - start, 'matches': len(df)}
+
+
+def bench_build(engine, dataset, method, matches_per_team=40):
+	"""
+	Time building a graph edge by edge (add_edge) or in bulk (from_matches)
+	"""
+	home, away, home_goals, away_goals = dataset_matches(dataset, matches_per_team)
+	start = time.time()
+	if method == 'add_edge':
+		G = ENGINES[engine](leak=0.2)
+		for home_team, away_team, home_score, away_score in zip(home, away, home_goals.tolist(), away_goals.tolist()):
+			G.add_edge(home_team, away_team, away_score)
+			G.add_edge(away_team, home_team, home_score)
+	else:
+		G = ENGINES[engine].from_matches(home, away, home_goals, away_goals, leak=0.2)
+	return {'wall_time': time.time() - start, 'teams': G.size, 'matches': len(home)}
+
+
+def bench_iterate(engine, dataset, iterations=5, tol=1e-6, matches_per_team=40):
+	"""
+	Time scorerank iterations (per iteration), then a full solve to tolerance
+	"""
+	home, away, home_goals, away_goals = dataset_matches(dataset, matches_per_team)
+	G = ENGINES[engine].from_matches(home, away, home_goals, away_goals, leak=0.2)
+	G.redistribute_scoreranks()
+	G.iterate_scoreranks()  # compiles the matrix for sparse engines, so it is not counted per iteration
+	start = time.time()
+	G.iterate_scoreranks_n(iterations)
+	per_iteration = (time.time() - start) / iterations
+	G.redistribute_scoreranks()
+	start = time.time()
+	G.solve(tol=tol, max_iter=1000)
+	return {'wall_time': time.time() - start, 'per_iteration': per_iteration, 'iterations': G.iterations,
+		'residual': G.residual, 'teams': G.size, 'matches': len(home)}
+
+
+def bench_partitioned(teams, cross_league=0.05, league_size=20, tol=1e-6, repeat=3):
+	"""
+	Time solving a synthetic multi-league graph all at once (G.solve) and by division (SR_League.solve_partitioned)
+
+	Both start from all scoreranks 1 with the matrix already compiled, best of repeat runs
+	"""
+	home, away, home_goals, away_goals = synthetic_matches(teams, league_size=league_size, cross_league=cross_league)
+	divisions = [int(name.split()[1]) // league_size for name in home]
+	G, partitions = SR_League.build_graph(home, away, home_goals, away_goals, divisions=divisions, graph_class=SR_Graph.CompactGraph)
+	G.transition_matrix()
+	times = {'monolithic': [], 'partitioned': []}
+	for _ in range(repeat):
+		G.redistribute_scoreranks()
+		start = time.time()
+		iterations, residual = G.solve(tol=tol, max_iter=1000)
+		times['monolithic'].append(time.time() - start)
+		G.redistribute_scoreranks()
+		start = time.time()
+		partitioned_iterations, partitioned_residual = SR_League.solve_partitioned(G, partitions, tol=tol, max_iter=1000)
+		times['partitioned'].append(time.time() - start)
+	return {'wall_time': min(times['partitioned']), 'monolithic_time': min(times['monolithic']),
+		'speedup': min(times['monolithic']) / min(times['partitioned']), 'iterations': partitioned_iterations,
+		'residual': partitioned_residual, 'monolithic_iterations': iterations, 'monolithic_residual': residual,
+		'partitions': int(partitions.max()) + 1, 'teams': G.size, 'matches': len(home)}
+
+
+def bench_backtest(engine, workers=1):
+	"""
+	Time the bookies correlation backtest over the bundled CSVs
+	"""
+	df = SR_Data.load_matches(BUNDLED_CSVS, columns=['Date', 'HomeTeam', 'AwayTeam', 'FTHG', 'FTAG', 'B365H', 'B365D', 'B365A'])
+	matches = bookies_correlation.match_arrays(SR_Data.sort_by_date(df))
+	start = time.time()
+	if workers > 1:
+		rows, scorerank_differences, bookie_predictions = bookies_correlation.backtest_parallel(
+			matches, workers=workers, warm_start=False, graph_class=ENGINES[engine])
+	else:
+		rows, scorerank_differences, bookie_predictions = bookies_correlation.backtest(matches, warm_start=False, graph_class=ENGINES[engine])
+	wall_time = time.time() - start
+	r_squared = np.corrcoef(scorerank_differences, bookie_predictions)[0, 1]**2
+	return {'wall_time': wall_time, 'matches': len(df), 'predictions': len(rows), 'r_squared': r_squared}
+
+
+def current_memory_mb():
+	"""
+	Returns current resident memory of this process in MB (Linux), or the peak so far elsewhere
+	"""
+	try:
+		with open('/proc/self/statm') as f:
+			return int(f.read().split()[1]) * resource.getpagesize() / 1e6
+	except IOError:
+		return peak_memory_mb()
+
+
+def peak_memory_mb():
+	"""
+	Returns peak resident memory of this process in MB
+	"""
+	peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	return peak / 1e6 if sys.platform == 'darwin' else peak / 1e3  # bytes on macOS, KB on Linux
+
+
+def run_in_child(queue, function, kwargs):
+	"""
+	Run benchmark function and put its result, with memory used, on the queue (in the child process)
+	"""
+	before = current_memory_mb()
+	result = function(**kwargs)
+	result['peak_memory_mb'] = peak_memory_mb()
+	result['peak_memory_increase_mb'] = peak_memory_mb() - before
+	queue.put(result)
+
+
+def run_benchmark(name, function, **kwargs):
+	"""
+	Run one benchmark in a fresh process (so peak memory is its own), returns result record
+	"""
+	queue = multiprocessing.Queue()
+	process = multiprocessing.Process(target=run_in_child, args=(queue, function, kwargs))
+	process.start()
+	result = queue.get()
+	process.join()
+	record = {'benchmark': name}
+	record.update(kwargs)
+	record.update(result)
+	print >> sys.stderr, "{}: {}".format(name, ", ".join("{}={}".format(key, value) for key, value in sorted(kwargs.items())) +
+		" -> {:.3f}s, peak {:.0f}MB".format(record['wall_time'], record['peak_memory_mb']))
+	return record
+
+
+if __name__ == '__main__':
+
+	parser = argparse.ArgumentParser(description='Benchmark ScoreRank loading, construction, iteration and backtest')
+	parser.add_argument('--sizes', default='1000,10000,100000', help='synthetic league sizes (teams)')
+	parser.add_argument('--matches-per-team', type=int, default=40, help='matches each synthetic team plays (100k teams: 2M matches)')
+	parser.add_argument('--engines', default=','.join(sorted(ENGINES)), help='engines to compare')
+	parser.add_argument('--workers', type=int, default=1, help='workers for the backtest benchmark')
+	parser.add_argument('--output', help='JSON file to write (default: print to stdout)')
+	args = parser.parse_args()
+
+	engines = args.engines.split(',')
+	datasets = ['bundled'] + ['synthetic-{}'.format(size) for size in args.sizes.split(',') if size]
+
+	results = []
+	for mode in ['concat_all_columns', 'load_matches', 'load_matches_cached']:
+		results.append(run_benchmark('load_csv', bench_load_csv, mode=mode))
+	for dataset in datasets:
+		for engine in engines:
+			for method in ['add_edge', 'from_matches']:
+				results.append(run_benchmark('build', bench_build, engine=engine, dataset=dataset, method=method,
+					matches_per_team=args.matches_per_team))
+			results.append(run_benchmark('iterate', bench_iterate, engine=engine, dataset=dataset,
+				matches_per_team=args.matches_per_team))
+	for size in args.sizes.split(','):
+		if size:
+			results.append(run_benchmark('solve_partitioned', bench_partitioned, teams=int(size)))
+	for engine in engines:
+		results.append(run_benchmark('backtest', bench_backtest, engine=engine, workers=args.workers))
+
+	output = json.dumps({'python': sys.version.split()[0], 'numpy': np.__version__, 'pandas': pd.__version__,
+		'cpus': multiprocessing.cpu_count(), 'results': results}, indent=1)
+	if args.output:
+		with open(args.output, 'w') as f:
+			f.write(output)
+	else:
+		print output
@@ -2,47 +2,24 @@
 # As described on https://davidabelman.wordpress.com/2015/03/04/146/
 
 import pandas as pd
+import numpy as np
+import multiprocessing
 import SR_Graph
+import SR_Window
+import SR_Data
+import SR_Odds
+import SR_Snapshot
 import matplotlib.pyplot as plt
 import math
+import time
+import argparse
+import SR_Profile
 reload(SR_Graph)
-
-def open_and_combine_csvs(csv_list):
-	"""
-	Pass a list of csv filenames, all imported into one pandas dataframe
-	"""
-	first_file = True
-	for filename in csv_list:
-		if first_file:
-			df_final = pd.read_csv(filename)
-			first_file = False
-		else:
-			df_temp = pd.read_csv(filename)
-			df_final = pd.concat([df_final, df_temp], ignore_index=True)
-	return df_final
-
-def create_scorerank_graph(matches_to_use, option = None):
-	"""
-	Create a scorerank graph
-	"""
-	G = SR_Graph.Graph(leak=0.2)
-	for i in matches_to_use.index:
-		# Iterate through each match, pulling out Home/Away teams and goals scored
-		match_row = matches_to_use.ix[i]
-		home_team, away_team, home_score, away_score = match_row[[
-			'HomeTeam',
-			'AwayTeam',
-			'FTHG',
-			'FTAG'
-		]]		
-		# Add edges for each team's goals
-		G.add_edge(team_from = home_team, team_to = away_team, weight = int(away_score))
-		G.add_edge(team_from = away_team, team_to = home_team, weight = int(home_score))		
-
-	# Set each scorerank to 1 to start with and iterate
-	G.redistribute_scoreranks()
-	G.iterate_scoreranks_n(5)
-	return G
+reload(SR_Window)
+reload(SR_Data)
+reload(SR_Odds)
+reload(SR_Snapshot)
+reload(SR_Profile)
 
 def bookie_calculator(home_odds, draw_odds, away_odds, fn=None):
 	"""
@@ -62,23 +39,195 @@ def bookie_calculator(home_odds, draw_odds, away_odds, fn=None):
 		# Could add some function here to skew results, e.g. sigmoid, squared, etc.
 		return result
 
-def to_datetime(d):
+def predict_fixtures(G, home, away, appearances=None, matches_required=0):
+	"""
+	ScoreRank predictions for arrays of fixtures (e.g. a whole matchday) at once
+
+	Returns (differences, eligible) arrays: home minus away scorerank (NaN if a
+	team is not ranked), and whether the fixture can be predicted, i.e. both
+	teams are ranked and, if appearances is given (e.g. RollingWindow.appearances),
+	have played at least matches_required matches
+	"""
+	differences, eligible = G.scorerank_differences(home, away)
+	if appearances is not None:
+		home_appearances = np.array([appearances.get(team, 0) for team in home])
+		away_appearances = np.array([appearances.get(team, 0) for team in away])
+		eligible &= (home_appearances >= matches_required) & (away_appearances >= matches_required)
+	return differences, eligible
+
+def match_arrays(df):
+	"""
+	Convert match dataframe into compact NumPy arrays (teams as integer codes) for backtesting
+	"""
+	teams = sorted(set(df['HomeTeam']) | set(df['AwayTeam']))
+	return {
+		'teams': teams,
+		'home': pd.Categorical(df['HomeTeam'], categories=teams).codes.astype(np.int32),
+		'away': pd.Categorical(df['AwayTeam'], categories=teams).codes.astype(np.int32),
+		'home_goals': df['FTHG'].values.astype(np.int8),
+		'away_goals': df['FTAG'].values.astype(np.int8),
+		'dates': df['Date'].values,
+		'odds': df[['B365H', 'B365D', 'B365A']].values.astype(np.float32),
+	}
+
+def slice_matches(matches, start, end):
+	"""
+	Return match arrays for rows start..end-1 only
+	"""
+	sliced = dict((key, values[start:end]) for key, values in matches.items() if key != 'teams')
+	sliced['teams'] = matches['teams']
+	return sliced
+
+def backtest(matches, start=0, end=None, historical_match_number=380, matches_required=3, iterations=5, tol=None, warm_start=True, debug=False, rank_history=None, graph_class=SR_Graph.Graph, stats=None, half_life=None):
+	"""
+	Predict each match from start to end with a scorerank model of the matches before it
+
+	The model is updated at the first match of each date, from the previous
+	historical_match_number matches. Returns arrays of (row, SR, Bookie) for
+	matches where both teams have enough history. If a rank_history list is
+	given, (date, teams, scoreranks) is appended to it for every model.
+	graph_class is the engine used (SR_Graph.Graph, SparseGraph or CompactGraph).
+	If stats (an SR_Profile.Stats) is given, time spent in each stage and graph
+	counters are added to it. If half_life (days) is given, models use every
+	match from row 0 with goals decayed by age (SR_Window.DecayingWindow)
+	instead of the last historical_match_number matches; dates before start
+	are replayed without solving, dropping teams as a run from row 0 would
+	"""
+	if end is None:
+		end = len(matches['home'])
+	home, away, dates, odds = matches['home'], matches['away'], matches['dates'], matches['odds']
+	home_goals, away_goals = matches['home_goals'], matches['away_goals']
+
+	# Rolling graph of recent matches (includes row i itself, as the old df.ix[i-380:i] slice did, hence the +1)
+	if half_life is None:
+		window = SR_Window.RollingWindow(size=historical_match_number+1, leak=0.2, graph_class=graph_class)
+	else:
+		window = SR_Window.DecayingWindow(half_life=half_life, leak=0.2, graph_class=graph_class)
+	if stats is not None:
+		SR_Profile.instrument_graph(window.graph, stats)
+	first = max(start, historical_match_number)
+	if half_life is None:
+		next_row, replay_from = first - historical_match_number, first
+	else:
+		next_row, replay_from = 0, historical_match_number
+
+	# Rows from first to end in blocks of one date (each block predicted by one model), after any replayed dates
+	if first >= end:
+		return np.zeros(0, dtype=int), np.zeros(0), np.zeros(0)
+	block_starts = [replay_from] + (np.flatnonzero(dates[replay_from+1:end] != dates[replay_from:end-1]) + replay_from + 1).tolist()
+
+	rows, scorerank_differences = [], []
+	for i, block_end in zip(block_starts, block_starts[1:] + [end]):
+
+		# Update the model at the first match of each date:
+		match_date = dates[i]
+		if debug:
+			print "Match date ({}) not equal to previous, updating model".format(match_date)
+		# Add matches since the previous date to graph and expire old ones
+		if stats is not None:
+			started = time.time()
+		window.add_matches(zip(home[next_row:i+1], away[next_row:i+1], home_goals[next_row:i+1], away_goals[next_row:i+1], dates[next_row:i+1]))
+		if stats is not None:
+			stats.add_time('update graph', time.time() - started)
+			stats.count('matches added', i + 1 - next_row)
+			started = time.time()
+		next_row = i + 1
+		if i < first:
+			window.prune()  # as solving on this date would, so later models see the same teams
+			continue
+		G = window.solve(iterations=iterations, tol=tol, warm_start=warm_start)
+		if stats is not None:
+			stats.add_time('solve', time.time() - started)
+			stats.count('models')
+		if rank_history is not None:
+			teams = list(G)
+			rank_history.append((match_date, teams, [G.get_scorerank(team) for team in teams]))
+
+		# Predict all of the date's matches at once, keeping those where both teams have enough data
+		if stats is not None:
+			started = time.time()
+		differences, eligible = predict_fixtures(G, home[i:block_end], away[i:block_end], window.appearances, matches_required)
+		rows.append(np.flatnonzero(eligible) + i)
+		scorerank_differences.append(differences[eligible])
+		if stats is not None:
+			stats.add_time('predict', time.time() - started)
+			stats.count('predictions', eligible.sum())
+			stats.count('matches skipped', len(eligible) - eligible.sum())
+	rows = np.concatenate(rows)
+	scorerank_differences = np.concatenate(scorerank_differences)
+
+	# Bookie predictions for the same matches, use B365 only for now
+	home_odds, draw_odds, away_odds = odds[rows].astype(float).T
+	bookie_predictions = bookie_calculator(home_odds, draw_odds, away_odds)
+	if debug:
+		for i, scorerank_difference, bookie_prediction in zip(rows, scorerank_differences, bookie_predictions):
+			print "{} vs {}".format(matches['teams'][home[i]], matches['teams'][away[i]])
+			print "Scorerank: {}  - Bookies: {}".format(scorerank_difference, bookie_prediction)
+			print ""
+
+	return rows, scorerank_differences, bookie_predictions
+
+def backtest_chunk(args):
 	"""
-	Converts string date to datetime
+	Run backtest over one chunk of rows in a worker process, returning global row numbers
 	"""
-	import datetime
-	return datetime.datetime.strptime(d, '%d/%m/%y')
+	matches, offset, start, end, settings = args
+	rows, scorerank_differences, bookie_predictions = backtest(matches, start, end, **settings)
+	return rows + offset, scorerank_differences, bookie_predictions
 
-def enough_data(match_df, hometeam, awayteam):
+def backtest_parallel(matches, workers=None, chunks=None, **settings):
 	"""
-	Returns True if both teams appear in historical matches over threshold
+	Run backtest with the date range split into chunks over a pool of worker processes
+
+	Chunks always start on a new date so each model sees the same matches as in a
+	serial run: the history window before the chunk, or with half_life every
+	match before it. Output is identical to backtest(). Warm starting chains
+	every date's ranks back to the first, which chunks can't do, so settings
+	must include warm_start=False
 	"""
-	hometeam_appears_number = sum(match_df['HomeTeam']==hometeam)+sum(match_df['AwayTeam']==hometeam)
-	awayteam_appears_number = sum(match_df['HomeTeam']==awayteam)+sum(match_df['AwayTeam']==awayteam)
-	if hometeam_appears_number >= matches_required_for_prediction:
-		if awayteam_appears_number >= matches_required_for_prediction:
-			return True
-	return False
+	if settings.get('warm_start', True):
+		raise ValueError("backtest_parallel needs warm_start=False (chunks can't continue the serial warm-start chain)")
+	if workers is None:
+		workers = multiprocessing.cpu_count()
+	if chunks is None:
+		chunks = workers * 4
+	historical_match_number = settings.get('historical_match_number', 380)
+	dates = matches['dates']
+
+	# Split rows to predict into chunks, moving each boundary on to the start of a date
+	n = len(dates)
+	boundaries = [historical_match_number]
+	for target in np.linspace(historical_match_number, n, chunks + 1)[1:-1].astype(int):
+		while target < n and dates[target] == dates[target-1]:
+			target += 1
+		if target > boundaries[-1] and target < n:
+			boundaries.append(target)
+	boundaries.append(n)
+
+	# Send each worker only its chunk plus the history before it (all of it for decayed models)
+	tasks = []
+	for start, end in zip(boundaries[:-1], boundaries[1:]):
+		offset = max(start - historical_match_number, 0) if settings.get('half_life') is None else 0
+		tasks.append((slice_matches(matches, offset, end), offset, start - offset, end - offset, settings))
+	pool = multiprocessing.Pool(workers)
+	try:
+		results = pool.map(backtest_chunk, tasks)
+	finally:
+		pool.close()
+		pool.join()
+	return tuple(np.concatenate(parts) for parts in zip(*results))
+
+def results_frame(matches, rows, scorerank_differences, bookie_predictions):
+	"""
+	Dataframe of backtest results (rows = matches), built once from columns
+	"""
+	teams = np.array(matches['teams'], dtype=object)
+	return pd.DataFrame({
+		'HomeTeam': teams[matches['home'][rows]],
+		'AwayTeam': teams[matches['away'][rows]],
+		'SR': scorerank_differences,
+		'Bookie': bookie_predictions,
+	}, columns=['Bookie', 'HomeTeam', 'AwayTeam', 'SR'])
 
 
 # Main script below:
@@ -94,73 +243,88 @@ if __name__ == '__main__':
 	# Settings
 	historical_match_number = 380
 	matches_required_for_prediction = 3
+	scorerank_iterations = 5
+	scorerank_tolerance = None  # e.g. 1e-6 to iterate until converged instead
+	scorerank_warm_start = True  # start each date from previous ranks (False: all 1)
+	scorerank_half_life = None  # e.g. 180 (days) to use all matches so far, decayed by age, instead of the last historical_match_number
+	workers = 1  # processes to split the backtest over (needs scorerank_warm_start = False)
+	rank_history_path = None  # e.g. 'rank_history' to save every date's scoreranks (serial runs only)
 	debug = True
-	list_to_save = []
+
+	# Instrumentation is off unless asked for on the command line
+	parser = argparse.ArgumentParser(description='Correlate ScoreRank predictions with bookmakers odds')
+	parser.add_argument('--stats', action='store_true', help='print time per stage and graph counters at the end')
+	parser.add_argument('--profile', nargs='?', const='', metavar='PATH', help='run the backtest under cProfile (saved to PATH if given)')
+	args = parser.parse_args()
+	stats = SR_Profile.Stats() if args.stats else None
 
 	# Load CSV files into dataframe
 	years = range(2013, 2015)  
 	csv_list = ['{}.csv'.format(year) for year in years]
-	df = open_and_combine_csvs(csv_list)
+	started = time.time()
+	df = SR_Data.load_matches(csv_list, columns=['Date', 'HomeTeam', 'AwayTeam', 'FTHG', 'FTAG'] + SR_Odds.odds_columns())
+	if stats is not None:
+		stats.add_time('load', time.time() - started)
 	if debug:
 		print "Combined CVs and put into 'df' dataframe"
 
-	# Convert dates to datetime and sort
-	df['Date'] = df['Date'].apply(to_datetime)
-	df.sort(['Date'], inplace=True)
-	df = df.reindex(range(len(df)))
+	# Sort by date (converted to datetime when loaded)
+	df = SR_Data.sort_by_date(df)
 	if debug:
 		print "Converted dates to datetimes"
 		print df['Date'].head()
 
-	# For each line in df
-	previous_date = None
-	for i in df.index:		
-		match_row = df.ix[i]
-
-		# Skip if not enough historical matches
-		if i<historical_match_number:
-			if debug:
-				print "i = {}, < {} so skipping...".format(i, historical_match_number)
-			continue
-		if debug:
-			print "i = {}, > {} so continuing...".format(i, historical_match_number)
-
-		# If date not previously considered, create a new model:
-		match_date = match_row['Date']		
-		if match_date != previous_date:
-			if debug:
-				print "Match date ({}) not equal to previous, creating new model".format(match_date)
-			# Find previous X matches prior to this date, create graph
-			i_start = i - historical_match_number
-			matches_to_use = df.ix[i_start:i]
-			G = create_scorerank_graph(matches_to_use)
-		previous_date = match_date
-
-		# Make prediction using graph, if enough data
-		home_team, away_team = match_row[ [ 'HomeTeam', 'AwayTeam' ] ]
-		if not enough_data(matches_to_use, home_team, away_team):
-			continue
-		scorerank_difference = G.get_scorerank(home_team) - G.get_scorerank(away_team)
-
-		# Make bookie prediction, use B365 only for now
-		home_odds, draw_odds, away_odds = match_row[ ['B365H', 'B365D', 'B365A'] ]
-		bookie_prediction = bookie_calculator(home_odds, draw_odds, away_odds)
-
-		# Save result
-		row_to_save = {'HomeTeam':home_team, 'AwayTeam':away_team, 'SR':scorerank_difference, 'Bookie':bookie_prediction}
-		list_to_save.append(row_to_save)
-		if debug:
-			print "{} vs {}".format(home_team, away_team)
-			print "Scorerank: {}  - Bookies: {}".format(scorerank_difference, bookie_prediction)
-			print ""
+	# Predict every match with enough history (in parallel if more than 1 worker)
+	started = time.time()
+	matches = match_arrays(df)
+	if stats is not None:
+		stats.add_time('match arrays', time.time() - started)
+	settings = {
+		'historical_match_number': historical_match_number,
+		'matches_required': matches_required_for_prediction,
+		'iterations': scorerank_iterations,
+		'tol': scorerank_tolerance,
+		'warm_start': scorerank_warm_start,
+		'half_life': scorerank_half_life,
+	}
+	if workers > 1:
+		started = time.time()
+		rows, scorerank_differences, bookie_predictions = backtest_parallel(matches, workers=workers, **settings)
+		if stats is not None:
+			stats.add_time('backtest (parallel)', time.time() - started)  # stages run in the workers
+	else:
+		rank_history = [] if rank_history_path else None
+		if args.profile is not None:
+			(rows, scorerank_differences, bookie_predictions), profiler = SR_Profile.profile(
+				backtest, matches, debug=debug, rank_history=rank_history, stats=stats, **settings)
+		else:
+			rows, scorerank_differences, bookie_predictions = backtest(matches, debug=debug, rank_history=rank_history, stats=stats, **settings)
+		if rank_history_path:
+			SR_Snapshot.save_rank_history(rank_history_path, rank_history, team_names=matches['teams'])
 
 	# Convert all of our calculations (rows = matches) to a dataframe
-	final_df = pd.DataFrame(list_to_save)
+	final_df = results_frame(matches, rows, scorerank_differences, bookie_predictions)
 
 	# Calculate success metric
 	correlation = final_df.SR.corr(final_df.Bookie)
 	print "Correlation between Bet365 and ScoreRank: {}".format(correlation**2)
 
+	# Same for every other bookmaker, and their consensus, from the same run
+	bookmaker_predictions = SR_Odds.implied_predictions(df).iloc[rows].dropna(axis=1, how='all')
+	individual_bookmakers = [bookmaker for bookmaker in bookmaker_predictions if not bookmaker.startswith('Bb')]
+	bookmaker_predictions['Consensus'] = SR_Odds.consensus(bookmaker_predictions[individual_bookmakers])
+	for bookmaker in bookmaker_predictions:
+		correlation = pd.Series(final_df.SR.values).corr(pd.Series(bookmaker_predictions[bookmaker].values))
+		print "  {}: {} ({} matches)".format(bookmaker, correlation**2, bookmaker_predictions[bookmaker].count())
+
+	# Where the time went
+	if args.profile is not None and workers <= 1:
+		print ""
+		SR_Profile.print_profile(profiler, args.profile)
+	if stats is not None:
+		print ""
+		print stats.summary()
+
 	# Plot the correlation
 	plt.scatter(final_df.SR, final_df.Bookie)
 	plt.title('Correlation between ScoreRank model and Bet365 odds')
@@ -0,0 +1,67 @@
+# Load test for SR_Server: fires prediction requests from several threads, reports latency percentiles and throughput
+# Start the server first (python SR_Server.py), then: python load_test_server.py --requests 5000 --concurrency 8
+
+import json
+import time
+import socket
+import random
+import urllib
+import httplib
+import argparse
+import threading
+import numpy as np
+
+
+def run_client(host, port, requests, teams, batch_size, latencies):
+	"""
+	Send requests over one kept-alive connection, appending each latency (seconds) to latencies
+	"""
+	connection = httplib.HTTPConnection(host, port)
+	connection.connect()
+	connection.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+	for _ in range(requests):
+		if batch_size > 1:
+			fixtures = [random.sample(teams, 2) for _ in range(batch_size)]
+			start = time.time()
+			connection.request('POST', '/predict', json.dumps(fixtures), {'Content-Type': 'application/json'})
+		else:
+			home_team, away_team = random.sample(teams, 2)
+			start = time.time()
+			connection.request('GET', '/predict?' + urllib.urlencode({'home': home_team, 'away': away_team}))
+		response = connection.getresponse()
+		response.read()
+		latencies.append(time.time() - start)
+	connection.close()
+
+
+if __name__ == '__main__':
+
+	parser = argparse.ArgumentParser(description='Load test a running SR_Server')
+	parser.add_argument('--host', default='127.0.0.1')
+	parser.add_argument('--port', type=int, default=8000)
+	parser.add_argument('--requests', type=int, default=2000, help='requests per client thread')
+	parser.add_argument('--concurrency', type=int, default=4, help='client threads')
+	parser.add_argument('--batch', type=int, default=1, help='fixtures per request (>1 uses batched POST /predict)')
+	args = parser.parse_args()
+
+	# Teams known to the server
+	connection = httplib.HTTPConnection(args.host, args.port)
+	connection.request('GET', '/ranks')
+	teams = [team for team, _ in json.loads(connection.getresponse().read())['scoreranks']]
+	connection.close()
+
+	latencies = []
+	threads = [threading.Thread(target=run_client, args=(args.host, args.port, args.requests, teams, args.batch, latencies))
+		for _ in range(args.concurrency)]
+	start = time.time()
+	for thread in threads:
+		thread.start()
+	for thread in threads:
+		thread.join()
+	elapsed = time.time() - start
+
+	latencies = np.array(latencies) * 1000
+	print "{} requests ({} fixtures each) from {} clients in {:.2f}s".format(len(latencies), args.batch, args.concurrency, elapsed)
+	print "Throughput: {:.0f} requests/s, {:.0f} fixtures/s".format(len(latencies) / elapsed, len(latencies) * args.batch / elapsed)
+	print "Latency: p50 {:.2f}ms, p99 {:.2f}ms, max {:.2f}ms".format(
+		np.percentile(latencies, 50), np.percentile(latencies, 99), latencies.max())
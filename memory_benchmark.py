@@ -0,0 +1,68 @@
+# Compares memory held by each graph engine when keeping one solved ScoreRank graph per match date
+# Builds the previous 380 matches' graph at every match date over the 2007-2014 seasons
+
+import sys
+import array
+import numpy as np
+import scipy.sparse as sp
+import SR_Graph
+import SR_Data
+reload(SR_Graph)
+reload(SR_Data)
+
+
+def deep_sizeof(obj, seen=None):
+	"""
+	Returns approximate number of bytes used by an object and everything it references (each object counted once)
+	"""
+	if seen is None:
+		seen = set()
+	if id(obj) in seen:
+		return 0
+	seen.add(id(obj))
+	if isinstance(obj, np.ndarray):
+		return sys.getsizeof(obj) if obj.base is None else obj.nbytes
+	if sp.issparse(obj):
+		return sum(deep_sizeof(part, seen) for part in [obj.data, obj.indices, obj.indptr])
+	size = sys.getsizeof(obj)
+	if isinstance(obj, (str, unicode, int, float, array.array)):
+		return size
+	if isinstance(obj, dict):
+		size += sum(deep_sizeof(key, seen) + deep_sizeof(value, seen) for key, value in obj.items())
+	elif isinstance(obj, (list, tuple, set)):
+		size += sum(deep_sizeof(item, seen) for item in obj)
+	if hasattr(obj, '__dict__'):
+		size += deep_sizeof(obj.__dict__, seen)
+	for slot in getattr(type(obj), '__slots__', []):
+		size += deep_sizeof(getattr(obj, slot), seen)
+	return size
+
+
+if __name__ == '__main__':
+
+	# Settings
+	historical_match_number = 380
+	engines = [SR_Graph.Graph, SR_Graph.SparseGraph, SR_Graph.CompactGraph]
+
+	# Load CSV files into dataframe
+	years = range(2007, 2015)
+	csv_list = ['{}.csv'.format(year) for year in years]
+	df = SR_Data.sort_by_date(SR_Data.load_matches(csv_list, columns=['Date', 'HomeTeam', 'AwayTeam', 'FTHG', 'FTAG']))
+	home, away = df['HomeTeam'].values, df['AwayTeam'].values
+	home_goals, away_goals = df['FTHG'].values, df['FTAG'].values
+	dates = df['Date'].values
+	first_rows = [i for i in range(historical_match_number, len(df)) if dates[i] != dates[i-1]]
+
+	# Build and solve one graph per match date with each engine, measure what is held
+	for engine in engines:
+		graphs = []
+		for i in first_rows:
+			window = slice(i - historical_match_number, i + 1)
+			G = engine.from_matches(home[window], away[window], home_goals[window], away_goals[window], leak=0.2)
+			G.redistribute_scoreranks()
+			G.iterate_scoreranks_n(5)
+			graphs.append(G)
+		seen = set(id(team) for G in graphs for team in G)  # team names are shared, don't count them
+		total = sum(deep_sizeof(G, seen) for G in graphs)
+		print "{}: {} graphs, {:.1f} MB total, {:.1f} KB per graph".format(
+			engine.__name__, len(graphs), total / 1e6, total / 1e3 / len(graphs))
@@ -0,0 +1,44 @@
+import os
+import unittest
+import pandas as pd
+import SR_Graph
+import SR_Window
+import SR_Profile
+
+
+SEASON_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)), '2014.csv')
+
+
+def window_counters(graph_class, size=100):
+	"""
+	Returns counters from an instrumented rolling window over a season, solved every 20 matches
+	"""
+	df = pd.read_csv(SEASON_CSV)
+	stats = SR_Profile.Stats()
+	window = SR_Window.RollingWindow(size=size, graph_class=graph_class)
+	SR_Profile.instrument_graph(window.graph, stats)
+	matches = zip(df['HomeTeam'], df['AwayTeam'], df['FTHG'], df['FTAG'])
+	for start in range(0, len(matches), 20):
+		window.add_matches(matches[start:start + 20])
+		window.solve(iterations=5)
+	return stats.counters, len(matches)
+
+
+class InstrumentGraphTest(unittest.TestCase):
+
+	def test_counters_match_across_engines(self):
+		counters, _ = window_counters(SR_Graph.Graph)
+		for graph_class in [SR_Graph.SparseGraph, SR_Graph.CompactGraph]:
+			engine_counters, _ = window_counters(graph_class)
+			engine_counters.pop('matrix builds')
+			self.assertEqual(engine_counters, counters, graph_class.__name__)
+
+	def test_edge_counts(self):
+		for graph_class in [SR_Graph.Graph, SR_Graph.SparseGraph, SR_Graph.CompactGraph]:
+			counters, matches = window_counters(graph_class, size=100)
+			self.assertEqual(counters['edges added'], 2 * matches)
+			self.assertEqual(counters['edges removed'], 2 * (matches - 100))
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,65 @@
+# Compares iterations needed to converge ScoreRank from scratch vs. warm-started from the previous date's graph
+# Ranks the previous 380 matches at every match date over the 2007-2014 seasons, as the bookies_correlation backtest does
+
+import time
+import SR_Window
+import SR_Data
+reload(SR_Window)
+reload(SR_Data)
+
+
+if __name__ == '__main__':
+
+	# Settings
+	historical_match_number = 380
+	tolerance = 1e-8
+	max_iterations = 1000
+
+	# Load CSV files into dataframe, sorted by date
+	years = range(2007, 2015)
+	csv_list = ['{}.csv'.format(year) for year in years]
+	df = SR_Data.load_matches(csv_list, columns=['Date', 'HomeTeam', 'AwayTeam', 'FTHG', 'FTAG'])
+	df = SR_Data.sort_by_date(df)
+	dates = df['Date'].values
+	matches = df[['HomeTeam', 'AwayTeam', 'FTHG', 'FTAG']].values
+
+	# Rank the window before each match date, cold (all scoreranks 1) and warm (seeded from previous date)
+	window = SR_Window.RollingWindow(size=historical_match_number+1, leak=0.2)
+	next_row = 0
+	cold_iterations, warm_iterations = 0, 0
+	cold_time, warm_time = 0.0, 0.0
+	max_difference = 0.0
+	dates_ranked = 0
+	previous_date = None
+	previous_scoreranks = {}
+	for i in range(historical_match_number, len(df)):
+		match_date = dates[i]
+		if match_date == previous_date:
+			continue
+		previous_date = match_date
+		window.add_matches(matches[next_row:i+1])
+		next_row = i + 1
+		G = window.graph
+
+		start = time.time()
+		G.redistribute_scoreranks()
+		G.solve(tol=tolerance, max_iter=max_iterations)
+		cold_time += time.time() - start
+		cold_iterations += G.iterations
+		cold_scoreranks = dict(G.get_scoreranks())
+
+		start = time.time()
+		G.seed_scoreranks(previous_scoreranks)
+		G.solve(tol=tolerance, max_iter=max_iterations)
+		warm_time += time.time() - start
+		warm_iterations += G.iterations
+		previous_scoreranks = dict(G.get_scoreranks())
+
+		max_difference = max(max_difference, max(abs(cold_scoreranks[team] - G.get_scorerank(team)) for team in G))
+		dates_ranked += 1
+
+	print "Match dates ranked: {} (tolerance {})".format(dates_ranked, tolerance)
+	print "Cold start: {} iterations ({:.2f} per date), {:.2f}s".format(cold_iterations, cold_iterations*1.0/dates_ranked, cold_time)
+	print "Warm start: {} iterations ({:.2f} per date), {:.2f}s".format(warm_iterations, warm_iterations*1.0/dates_ranked, warm_time)
+	print "Iterations saved: {:.1%}".format(1 - warm_iterations*1.0/cold_iterations)
+	print "Max scorerank difference between cold and warm: {}".format(max_difference)